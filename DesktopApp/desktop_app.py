@@ -18,6 +18,12 @@ from PyQt5.QtGui import *
 # API Configuration
 API_BASE = "http://127.0.0.1:8000/api"
 
+# File types accepted by the upload endpoint
+UPLOAD_EXTENSIONS = (
+    '.csv', '.csv.gz', '.csv.zst', '.csv.bz2', '.csv.xz',
+    '.parquet', '.arrow', '.feather', '.arrows',
+)
+
 class ModernButton(QPushButton):
     def __init__(self, text="", icon=None, primary=False, outline=False):
         super().__init__(text)
@@ -100,7 +106,7 @@ class UploadZone(QWidget):
         
         # Requirements
         self.req_text = QLabel(
-            "Supports: .csv files only\n"
+            "Supports: .csv (plain or .gz/.zst/.bz2/.xz), .parquet and .arrow files\n"
             "Required columns: Equipment Name, Type, Flowrate, Pressure, Temperature"
         )
         self.req_text.setObjectName("uploadRequirements")
@@ -126,7 +132,7 @@ class UploadZone(QWidget):
         self.set_drag_active(False)
         if event.mimeData().hasUrls():
             urls = event.mimeData().urls()
-            if urls and urls[0].toLocalFile().endswith('.csv'):
+            if urls and urls[0].toLocalFile().lower().endswith(UPLOAD_EXTENSIONS):
                 self.file_dropped.emit(urls[0].toLocalFile())
                 
     def set_drag_active(self, active):
@@ -353,6 +359,14 @@ class ChemicalEquipmentApp(QMainWindow):
         self.sidebar_collapsed = False
         self.summary_data = None
         self.history_data = []
+        # ETag of the last history response, so unchanged polls get a 304
+        self.history_etag = None
+        self.histogram_data = None
+        self.histogram_summary_id = None
+        self.upload_job_id = None
+        self.job_timer = QTimer(self)
+        self.job_timer.setInterval(500)
+        self.job_timer.timeout.connect(self.check_upload_job)
         self.developer_info = {
             "name": "Shruti Mehkarkar", 
             "university": "VIT Bhopal University", 
@@ -821,9 +835,46 @@ class ChemicalEquipmentApp(QMainWindow):
         charts_layout.addWidget(type_chart_widget)
         charts_layout.addWidget(avg_chart_widget)
         
+        # Parameter distribution chart (server-side histogram bins)
+        dist_chart_widget = QWidget()
+        dist_chart_widget.setObjectName("chartCard")
+        dist_layout = QVBoxLayout(dist_chart_widget)
+        
+        dist_title = QLabel("Parameter Distributions")
+        dist_title.setObjectName("chartTitle")
+        
+        self.dist_figure = Figure(figsize=(12, 3.5))
+        self.dist_canvas = FigureCanvas(self.dist_figure)
+        self.dist_canvas.setMinimumHeight(280)
+        
+        dist_layout.addWidget(dist_title)
+        dist_layout.addWidget(self.dist_canvas)
+        
+        # Parameter correlation heatmap
+        corr_chart_widget = QWidget()
+        corr_chart_widget.setObjectName("chartCard")
+        corr_layout = QVBoxLayout(corr_chart_widget)
+        
+        corr_title = QLabel("Parameter Correlation")
+        corr_title.setObjectName("chartTitle")
+        
+        self.corr_figure = Figure(figsize=(4, 3.5))
+        self.corr_canvas = FigureCanvas(self.corr_figure)
+        self.corr_canvas.setMinimumHeight(280)
+        
+        corr_layout.addWidget(corr_title)
+        corr_layout.addWidget(self.corr_canvas)
+        
+        detail_charts = QWidget()
+        detail_layout = QHBoxLayout(detail_charts)
+        detail_layout.setSpacing(30)
+        detail_layout.addWidget(dist_chart_widget, 2)
+        detail_layout.addWidget(corr_chart_widget, 1)
+        
         layout.addWidget(header)
         layout.addWidget(self.stats_grid)
         layout.addWidget(charts_container)
+        layout.addWidget(detail_charts)
         
         layout.addStretch()
         
@@ -1949,7 +2000,8 @@ class ChemicalEquipmentApp(QMainWindow):
         
     def upload_csv(self):
         file_path, _ = QFileDialog.getOpenFileName(
-            self, "Select CSV File", "", "CSV Files (*.csv)"
+            self, "Select Data File", "",
+            "Equipment Data (" + " ".join("*" + ext for ext in UPLOAD_EXTENSIONS) + ")"
         )
         
         if file_path:
@@ -1959,27 +2011,45 @@ class ChemicalEquipmentApp(QMainWindow):
         try:
             self.show_loading()
             
-            # Validate CSV
-            with open(file_path, 'r') as f:
-                first_line = f.readline()
-                required_cols = ["Equipment Name", "Type", "Flowrate", "Pressure", "Temperature"]
-                if not all(col in first_line for col in required_cols):
-                    raise Exception("CSV missing required columns. Needs: Equipment Name, Type, Flowrate, Pressure, Temperature")
+            # Validate CSV (compressed files are checked by the backend)
+            if file_path.lower().endswith('.csv'):
+                with open(file_path, 'r') as f:
+                    first_line = f.readline()
+                    required_cols = ["Equipment Name", "Type", "Flowrate", "Pressure", "Temperature"]
+                    if not all(col in first_line for col in required_cols):
+                        raise Exception("CSV missing required columns. Needs: Equipment Name, Type, Flowrate, Pressure, Temperature")
                     
-            # Upload file
+            # Upload file; the backend processes it in a background job
             with open(file_path, 'rb') as f:
                 files = {'file': f}
-                response = requests.post(f"{API_BASE}/upload/", files=files)
+                response = requests.post(f"{API_BASE}/upload/", files=files, data={'mode': 'async'})
                 
-            if response.status_code != 200:
+            if response.status_code != 202:
                 raise Exception(f"Upload failed: {response.text}")
                 
-            # Get summary
-            summary_response = requests.get(f"{API_BASE}/summary/")
-            if summary_response.status_code != 200:
-                raise Exception("Failed to get summary")
+            # Poll the job without blocking the UI
+            self.upload_job_id = response.json()['job_id']
+            self.job_timer.start()
                 
-            self.summary_data = summary_response.json()
+        except Exception as e:
+            self.hide_loading()
+            self.show_error(str(e))
+            
+    def check_upload_job(self):
+        try:
+            response = requests.get(f"{API_BASE}/jobs/{self.upload_job_id}/")
+            if response.status_code != 200:
+                raise Exception("Failed to get upload status")
+                
+            job = response.json()
+            if job['status'] in ('queued', 'running'):
+                return
+                
+            self.job_timer.stop()
+            if job['status'] == 'failed':
+                raise Exception(f"Upload failed: {job['error']}{self.format_validation(job.get('validation'))}")
+                
+            self.summary_data = job['summary']
             
             # Update all views
             self.load_history()
@@ -1995,9 +2065,20 @@ class ChemicalEquipmentApp(QMainWindow):
                 f"✅ Successfully processed {self.summary_data['total_equipment']} equipment records!")
                 
         except Exception as e:
+            self.job_timer.stop()
             self.hide_loading()
             self.show_error(str(e))
             
+    def format_validation(self, report):
+        if not report:
+            return ""
+        lines = []
+        for error, info in report.get('errors', {}).items():
+            columns = ", ".join(f"{col} ({n})" for col, n in info['columns'].items())
+            rows = ", ".join(str(r) for r in info['rows'][:5])
+            lines.append(f"• {error.replace('_', ' ')}: {info['count']} in {columns} — e.g. rows {rows}")
+        return "\n" + "\n".join(lines)
+        
     def show_error(self, message):
         self.error_message.setText(message)
         self.error_card.show()
@@ -2011,8 +2092,13 @@ class ChemicalEquipmentApp(QMainWindow):
         
     def load_history(self):
         try:
-            response = requests.get(f"{API_BASE}/history/")
+            headers = {"If-None-Match": self.history_etag} if self.history_etag else {}
+            response = requests.get(f"{API_BASE}/history/", headers=headers)
+            if response.status_code == 304:
+                # Nothing uploaded since the last fetch
+                return
             if response.status_code == 200:
+                self.history_etag = response.headers.get("ETag")
                 self.history_data = response.json()
                 
                 # Debug: Print API response
@@ -2053,6 +2139,7 @@ class ChemicalEquipmentApp(QMainWindow):
                     child.setText(value)
                     
         # Update charts
+        self.load_histograms()
         self.update_charts()
         
         # Enable export button
@@ -2156,6 +2243,85 @@ class ChemicalEquipmentApp(QMainWindow):
         self.avg_figure.tight_layout()
         self.avg_canvas.draw()
         
+        # Update parameter distribution chart
+        self.dist_figure.clear()
+        self.dist_figure.patch.set_facecolor(bg_color)
+        histograms = self.histogram_data or {}
+        
+        for index, (name, color) in enumerate(zip(['flowrate', 'pressure', 'temperature'], bar_colors)):
+            ax = self.dist_figure.add_subplot(1, 3, index + 1)
+            ax.set_facecolor(bg_color)
+            ax.set_title(name.capitalize(), color=text_color, fontsize=12, fontweight='bold')
+            ax.tick_params(colors=text_color, labelsize=9)
+            
+            for spine in ax.spines.values():
+                spine.set_color(spine_color)
+                spine.set_linewidth(1)
+                
+            bins = (histograms.get(name) or {}).get('fixed')
+            if not bins:
+                ax.text(0.5, 0.5, 'No data', ha='center', va='center',
+                        color=text_color, transform=ax.transAxes)
+                continue
+                
+            edges = bins['edges']
+            # A single value gives a zero-width bin; draw it with unit width
+            widths = [(right - left) or 1 for left, right in zip(edges, edges[1:])]
+            ax.bar(edges[:-1], bins['counts'], width=widths, align='edge',
+                   color=color, edgecolor=bg_color, linewidth=0.5)
+            ax.grid(True, axis='y', alpha=0.3, color=grid_color, linestyle='--', linewidth=0.5)
+            ax.set_axisbelow(True)
+            
+        self.dist_figure.tight_layout()
+        self.dist_canvas.draw()
+        
+        # Update correlation heatmap
+        self.corr_figure.clear()
+        self.corr_figure.patch.set_facecolor(bg_color)
+        ax3 = self.corr_figure.add_subplot(111)
+        ax3.set_facecolor(bg_color)
+        correlations = self.summary_data.get('correlations')
+        
+        if correlations:
+            labels = [name.capitalize() for name in correlations['parameters']]
+            matrix = [[float('nan') if value is None else value for value in row]
+                      for row in correlations['correlation']]
+            image = ax3.imshow(matrix, cmap='coolwarm', vmin=-1, vmax=1)
+            ax3.set_xticks(range(len(labels)))
+            ax3.set_yticks(range(len(labels)))
+            ax3.set_xticklabels(labels, rotation=30, ha='right', color=text_color, fontsize=9)
+            ax3.set_yticklabels(labels, color=text_color, fontsize=9)
+            
+            for i, row in enumerate(correlations['correlation']):
+                for j, value in enumerate(row):
+                    ax3.text(j, i, '—' if value is None else f'{value:.2f}',
+                             ha='center', va='center', color='#111827', fontsize=10, fontweight='bold')
+                             
+            colorbar = self.corr_figure.colorbar(image, ax=ax3, fraction=0.046, pad=0.04)
+            colorbar.ax.tick_params(colors=text_color, labelsize=8)
+        else:
+            ax3.axis('off')
+            ax3.text(0.5, 0.5, 'No data', ha='center', va='center',
+                     color=text_color, transform=ax3.transAxes)
+            
+        self.corr_figure.tight_layout()
+        self.corr_canvas.draw()
+        
+    def load_histograms(self):
+        summary_id = self.summary_data.get('id')
+        if summary_id is None or summary_id == self.histogram_summary_id:
+            return
+            
+        self.histogram_data = None
+        try:
+            response = requests.get(f"{API_BASE}/summaries/{summary_id}/histograms/",
+                                    params={'kind': 'fixed'})
+            if response.status_code == 200:
+                self.histogram_data = response.json()['histograms']
+        except Exception as e:
+            print(f"[ERROR] Error loading histograms: {e}")
+        self.histogram_summary_id = summary_id
+        
     def update_reports_view(self):
         # Update current report
         if self.summary_data:
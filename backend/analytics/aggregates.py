@@ -0,0 +1,50 @@
+"""
+Aggregates across uploads, merged from stored sufficient statistics.
+
+The fleet aggregate covers every upload ever stored and is updated in the same
+transaction as each new summary, so reading it costs one row. Aggregates over
+a chosen set or time range of summaries merge their stored states, which
+costs O(number of summaries) and never touches the rows themselves.
+"""
+from .ingest import SummaryAccumulator
+from .models import EquipmentSummary, FleetAggregate
+
+FLEET_ID = 1
+
+
+def merge_summaries(summaries):
+    """
+    Merge the stored state of ``summaries``. Returns the accumulator plus the
+    ids of summaries saved before statistics were stored, whose contribution
+    is approximate (see SummaryAccumulator.from_summary).
+    """
+    merged = SummaryAccumulator()
+    approximate = []
+    for summary in summaries:
+        if not summary.stats:
+            approximate.append(summary.pk)
+        merged.merge(SummaryAccumulator.from_summary(summary))
+    return merged, approximate
+
+
+def update_fleet(accumulators, uploads=None, exclude=()):
+    """
+    Fold newly stored data into the fleet aggregate. Must run inside the
+    transaction that stores it. ``uploads`` is the number of new uploads
+    (appends add rows but no upload). If the aggregate does not exist yet it
+    is seeded from the summaries already stored, except ``exclude``.
+    """
+    fleet = FleetAggregate.objects.select_for_update().filter(pk=FLEET_ID).first()
+    if fleet is None:
+        existing = EquipmentSummary.objects.exclude(pk__in=exclude)
+        merged, _ = merge_summaries(existing)
+        fleet = FleetAggregate(pk=FLEET_ID, uploads=existing.count())
+    else:
+        merged = SummaryAccumulator.from_state(fleet.stats)
+
+    for accumulator in accumulators:
+        merged.merge(accumulator)
+    fleet.stats = merged.to_state()
+    fleet.uploads += len(accumulators) if uploads is None else uploads
+    fleet.save()
+    return fleet
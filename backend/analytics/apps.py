@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class AnalyticsConfig(AppConfig):
     name = 'analytics'
+
+    def ready(self):
+        from .workers import connect_recovery
+        connect_recovery()
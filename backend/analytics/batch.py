@@ -0,0 +1,170 @@
+"""
+Batch uploads: many files (or one zip of files) summarised in parallel.
+
+Every file is parsed on the worker pool, all resulting summaries are written
+in a single transaction with one history trim, and then the files are scanned
+for outliers on the pool as well. A merged summary across the whole batch is
+returned alongside the per-file results.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import uuid
+import zipfile
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.utils.text import get_valid_filename
+
+from .ingest import IngestError, SummaryAccumulator
+from .models import EquipmentSummary
+from .records import load_records, records_enabled
+from .pipeline import find_duplicate, store_summaries
+from .serializers import EquipmentSummarySerializer
+from .workers import accumulate_path, load_outliers_path, submit
+from .writequeue import run_write
+
+logger = logging.getLogger(__name__)
+
+ZIP_MAGIC = b'PK\x03\x04'
+COPY_BUFFER_SIZE = 1024 * 1024
+DEFAULT_MAX_EXPANDED_SIZE = 1024 ** 3
+
+
+def _safe_name(name, index):
+    try:
+        return f'{index:04d}_{get_valid_filename(os.path.basename(name))}'
+    except SuspiciousFileOperation:
+        return f'{index:04d}_upload'
+
+
+def _is_zip(file):
+    head = file.read(4)
+    file.seek(0)
+    return head == ZIP_MAGIC
+
+
+def spool_files(files, directory):
+    """
+    Copy the uploaded files into ``directory`` so worker processes can open
+    them by path, hashing the bytes on the way. A single zip upload is expanded
+    into its members. Returns a list of (display name, path, SHA-256).
+    """
+    if len(files) == 1 and _is_zip(files[0]):
+        try:
+            archive = zipfile.ZipFile(files[0])
+        except zipfile.BadZipFile as exc:
+            raise IngestError(f"Could not read zip archive: {exc}") from exc
+        members = [
+            info for info in archive.infolist()
+            if not info.is_dir() and not os.path.basename(info.filename).startswith('.')
+            and not info.filename.startswith('__MACOSX/')
+        ]
+        # Checked before extracting; zipfile never reads past a member's declared size
+        max_size = getattr(settings, 'ANALYTICS_BATCH_MAX_EXPANDED_SIZE', DEFAULT_MAX_EXPANDED_SIZE)
+        expanded = sum(info.file_size for info in members)
+        if expanded > max_size:
+            raise IngestError(
+                f"The archive expands to {expanded} bytes; at most {max_size} are allowed."
+            )
+        sources = [(info.filename, lambda info=info: archive.open(info)) for info in members]
+    else:
+        sources = [(file.name, lambda file=file: file) for file in files]
+
+    max_files = getattr(settings, 'ANALYTICS_BATCH_MAX_FILES', 100)
+    if len(sources) > max_files:
+        raise IngestError(f"A batch may contain at most {max_files} files.")
+
+    spooled = []
+    for index, (name, open_source) in enumerate(sources):
+        path = os.path.join(directory, _safe_name(name, index))
+        digest = hashlib.sha256()
+        with open_source() as source, open(path, 'wb') as target:
+            for data in iter(lambda: source.read(COPY_BUFFER_SIZE), b''):
+                digest.update(data)
+                target.write(data)
+        spooled.append((name, path, digest.hexdigest()))
+    return spooled
+
+
+def process_batch(files, force=False):
+    """
+    Summarise ``files`` in parallel and store every new summary at once.
+
+    Files whose content was summarised before (or appears earlier in the same
+    batch) are not parsed again unless ``force`` is set. Returns a dict with
+    per-file results and the merged summary.
+    """
+    directory = os.path.join(settings.MEDIA_ROOT, 'uploads', 'batch', uuid.uuid4().hex)
+    os.makedirs(directory)
+    try:
+        spooled = spool_files(files, directory)
+
+        jobs = []
+        submitted = {}
+        for name, path, digest in spooled:
+            existing = None if force else find_duplicate(digest)
+            if existing is not None:
+                jobs.append((name, path, digest, existing))
+            elif digest in submitted and not force:
+                jobs.append((name, path, digest, submitted[digest]))
+            else:
+                submitted[digest] = submit(accumulate_path, path)
+                jobs.append((name, path, digest, submitted[digest]))
+
+        results = []
+        merged = SummaryAccumulator()
+        summaries = []
+        paths = []
+        # Future -> index of its summary; results wait for the stored row
+        stored = {}
+        pending = []
+        for name, path, digest, source in jobs:
+            if isinstance(source, EquipmentSummary):
+                merged.merge(SummaryAccumulator.from_summary(source))
+                results.append({
+                    "file": name,
+                    "summary": EquipmentSummarySerializer(source).data,
+                    "deduplicated": True,
+                })
+                continue
+            try:
+                accumulator = source.result()
+            except IngestError as exc:
+                results.append({"file": name, "error": str(exc), "validation": exc.errors})
+                continue
+            except BrokenProcessPool:
+                # The worker died (e.g. out of memory); the pool is replaced on the next submit
+                results.append({"file": name, "error": "The worker parsing this file stopped unexpectedly."})
+                continue
+            merged.merge(accumulator)
+            result = {"file": name, "summary": None, "deduplicated": source in stored}
+            results.append(result)
+            if source not in stored:
+                stored[source] = len(summaries)
+                summaries.append({**accumulator.fields(), "content_sha256": digest})
+                paths.append(path)
+            pending.append((result, stored[source]))
+
+        records = run_write(store_summaries, summaries)
+        scans = [submit(load_outliers_path, record.pk, path) for record, path in zip(records, paths)]
+        for record, scan in zip(records, scans):
+            try:
+                record.outlier_count = scan.result()
+                record.outliers_loaded = True
+            except Exception:
+                # The summary is stored; it is left with outliers_loaded unset
+                logger.exception("Outlier scan for summary %s failed", record.pk)
+        if records_enabled():
+            # After the commit, so the summaries' transaction stays short
+            for record, path in zip(records, paths):
+                with open(path, 'rb') as file:
+                    load_records(record, file)
+        for result, index in pending:
+            result["summary"] = EquipmentSummarySerializer(records[index]).data
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return {"files": results, "merged": merged.summary() if merged.rows else None}
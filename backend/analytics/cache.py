@@ -0,0 +1,70 @@
+"""
+Versioned response cache for the read endpoints that only change on upload.
+
+A single version entry in the Django cache (a random token plus the time it
+was set) is replaced after every transaction that stores or changes
+summaries commits. Cached responses are keyed by that token, and their strong
+ETag and Last-Modified come from it too, so a conditional GET from a client
+that is up to date gets 304 Not Modified from one cache read, with no
+database query. A cold or cleared cache starts a new version.
+
+The cache must be shared by every process that stores uploads (the worker
+pool included), so settings use a file-based backend rather than locmem.
+"""
+import hashlib
+import uuid
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+VERSION_KEY = 'analytics:version'
+DEFAULT_TIMEOUT = 300
+
+
+def get_cache():
+    return caches[getattr(settings, 'ANALYTICS_CACHE_ALIAS', 'default')]
+
+
+def _new_version():
+    # Whole seconds, as Last-Modified cannot say more
+    version = {
+        "token": uuid.uuid4().hex,
+        "modified": datetime.now(timezone.utc).replace(microsecond=0),
+    }
+    get_cache().set(VERSION_KEY, version, timeout=None)
+    return version
+
+
+def get_version():
+    return get_cache().get(VERSION_KEY) or _new_version()
+
+
+def invalidate_on_commit():
+    """Start a new version once the current transaction commits."""
+    transaction.on_commit(_new_version)
+
+
+def version_etag(request, *args, **kwargs):
+    version = get_version()
+    # Distinct per path and query, so one URL's ETag is never valid for another
+    return hashlib.sha256(f'{version["token"]}:{request.get_full_path()}'.encode()).hexdigest()
+
+
+def version_modified(request, *args, **kwargs):
+    return get_version()["modified"]
+
+
+def cached_data(name, build):
+    """
+    ``build()``'s result, cached under the current version. ``name`` must be
+    unique per endpoint and query.
+    """
+    cache = get_cache()
+    key = f'analytics:{get_version()["token"]}:{name}'
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, getattr(settings, 'ANALYTICS_CACHE_TIMEOUT', DEFAULT_TIMEOUT))
+    return data
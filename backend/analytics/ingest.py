@@ -0,0 +1,798 @@
+"""
+Streaming ingestion of equipment CSV uploads.
+
+The upload is read in fixed-size chunks and folded into running sufficient
+statistics, so with the default C engine peak memory depends on the chunk
+size rather than on the size of the file. Only the columns that are
+aggregated are parsed, with their dtypes fixed up front, using pandas' C
+engine (or pyarrow's CSV reader, if configured). Compressed uploads are
+recognised by their magic bytes and decompressed on the fly as the parser
+reads. Parquet and Arrow IPC uploads skip text parsing entirely: Parquet is
+read column-projected, batch by batch. Uncompressed uploads that live on disk
+are memory-mapped rather than read through a Python file object, releasing
+pages as they are parsed.
+"""
+import bz2
+import contextlib
+import copy
+import csv
+import gzip
+import itertools
+import lzma
+import math
+import mmap
+import os
+import zlib
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+import numpy as np
+import pandas as pd
+
+from .sketches import DEFAULT_QUANTILES, HISTOGRAM_KINDS, HyperLogLog, KLLSketch
+
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+    from pyarrow import ipc as pa_ipc
+    from pyarrow import parquet as pq
+except ImportError:
+    pa = pa_csv = pa_ipc = pq = None
+
+try:
+    from compression import zstd
+except ImportError:
+    zstd = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Summary field suffix -> CSV column
+PARAMETERS = {
+    "flowrate": "Flowrate",
+    "pressure": "Pressure",
+    "temperature": "Temperature",
+}
+
+# Parameter pairs whose co-moments are kept for the covariance matrix
+PAIRS = list(itertools.combinations(PARAMETERS, 2))
+
+NAME_COLUMN = "Equipment Name"
+
+# Columns parsed from every upload; names feed the distinct count and row storage
+COLUMNS = [NAME_COLUMN, "Type", *PARAMETERS.values()]
+
+# Projected only when the upload has them
+OPTIONAL_COLUMNS = [NAME_COLUMN]
+
+DTYPES = {
+    NAME_COLUMN: "object",
+    "Type": "category",
+    **{column: "float64" for column in PARAMETERS.values()},
+}
+
+DEFAULT_CHUNK_SIZE = 100_000
+DEFAULT_BLOCK_SIZE = 16 * 1024 * 1024
+# Enough of the decompressed upload to hold its header line
+HEADER_READ_SIZE = 64 * 1024
+
+# CSV parsers: pandas' C engine reads one chunk at a time; pyarrow's streaming
+# reader is faster but reads ahead of the consumer, so memory grows with the file
+ENGINES = ['c', 'pyarrow']
+DEFAULT_ENGINE = 'c'
+
+
+# Errors raised by the decompressors on corrupt or truncated input
+DECOMPRESSION_ERRORS = (OSError, EOFError, zlib.error, lzma.LZMAError)
+if zstandard is not None:
+    DECOMPRESSION_ERRORS += (zstandard.ZstdError,)
+
+GZIP_MAGIC = b'\x1f\x8b'
+BZIP2_MAGIC = b'BZh'
+XZ_MAGIC = b'\xfd7zXZ\x00'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+PARQUET_MAGIC = b'PAR1'
+ARROW_FILE_MAGIC = b'ARROW1'
+ARROW_STREAM_MAGIC = b'\xff\xff\xff\xff'
+
+
+class IngestError(ValueError):
+    """
+    The upload could not be parsed into equipment rows. ``errors`` carries a
+    structured validation report when one is available.
+    """
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors
+
+    def __reduce__(self):
+        # Keep the report when the error crosses a process boundary
+        return (self.__class__, (str(self), self.errors))
+
+
+def get_chunk_size():
+    return getattr(settings, 'ANALYTICS_CSV_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+
+
+def get_block_size():
+    return getattr(settings, 'ANALYTICS_CSV_BLOCK_SIZE', DEFAULT_BLOCK_SIZE)
+
+
+def get_engine():
+    engine = getattr(settings, 'ANALYTICS_CSV_ENGINE', DEFAULT_ENGINE)
+    if engine not in ENGINES:
+        raise ImproperlyConfigured(
+            f"ANALYTICS_CSV_ENGINE must be one of {', '.join(map(repr, ENGINES))}, not {engine!r}."
+        )
+    if engine == 'pyarrow' and pa_csv is None:
+        raise ImproperlyConfigured("ANALYTICS_CSV_ENGINE is 'pyarrow' but pyarrow is not installed.")
+    return engine
+
+
+def _open_zstd(file):
+    if zstd is not None:
+        return zstd.ZstdFile(file)
+    if zstandard is not None:
+        return zstandard.ZstdDecompressor().stream_reader(file)
+    raise IngestError("Zstandard-compressed uploads require the 'zstandard' package.")
+
+
+def open_decompressed(file):
+    """
+    Return a binary stream over the uncompressed bytes of ``file``.
+
+    gzip, bzip2, xz and zstd are detected from the leading magic bytes; any
+    other content is returned unchanged. ``file`` must be seekable.
+    """
+    head = file.read(6)
+    file.seek(0)
+    if head.startswith(GZIP_MAGIC):
+        return gzip.GzipFile(fileobj=file, mode='rb')
+    if head.startswith(BZIP2_MAGIC):
+        return bz2.BZ2File(file)
+    if head.startswith(XZ_MAGIC):
+        return lzma.LZMAFile(file)
+    if head.startswith(ZSTD_MAGIC):
+        return _open_zstd(file)
+    return file
+
+
+def get_local_path(file):
+    """Return the filesystem path behind an upload, or None if it only lives in memory."""
+    if hasattr(file, 'temporary_file_path'):
+        return file.temporary_file_path()
+    # FieldFile exposes .path; plain file objects carry the path as .name
+    for attr in ('path', 'name'):
+        try:
+            path = getattr(file, attr, None)
+        except (NotImplementedError, ValueError):
+            continue
+        if isinstance(path, str) and os.path.isabs(path) and os.path.isfile(path):
+            return path
+    return None
+
+
+def _csv_header(file):
+    """Column names on the first line of a (possibly compressed) CSV upload."""
+    data = open_decompressed(file).read(HEADER_READ_SIZE)
+    file.seek(0)
+    line = data.split(b'\n', 1)[0].decode('utf-8-sig', errors='replace').rstrip('\r')
+    return next(csv.reader([line]), [])
+
+
+def _project(columns, names):
+    """``columns`` without the optional ones missing from ``names``."""
+    return [column for column in columns if column in names or column not in OPTIONAL_COLUMNS]
+
+
+def _arrow_schema(columns, lenient=False):
+    number = pa.string() if lenient else pa.float64()
+    types = {
+        NAME_COLUMN: pa.string(),
+        "Type": pa.dictionary(pa.int32(), pa.string()),
+        **{column: number for column in PARAMETERS.values()},
+    }
+    return pa.schema([(column, types[column]) for column in columns])
+
+
+def _to_frame(batch, schema):
+    """Project a columnar batch onto the schema's columns and dtypes."""
+    table = pa.Table.from_batches([batch]).select(schema.names)
+    return table.cast(schema).to_pandas()
+
+
+def _iter_pyarrow(file, path, chunk_size, columns, lenient):
+    """
+    Parse with pyarrow, which reads ``block_size`` bytes at a time; each
+    block's record batch is then sliced (without copying) into DataFrames of
+    at most ``chunk_size`` rows. The reader parses blocks ahead of the
+    consumer without a limit, so unlike the C engine its peak memory grows
+    with the file.
+    """
+    schema = _arrow_schema(columns, lenient)
+    source = pa.memory_map(path, 'r') if path else file
+    reader = pa_csv.open_csv(
+        source,
+        read_options=pa_csv.ReadOptions(block_size=get_block_size()),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=columns,
+            column_types=schema,
+            strings_can_be_null=True,
+        ),
+    )
+    for batch in reader:
+        for start in range(0, batch.num_rows, chunk_size):
+            yield batch.slice(start, chunk_size).to_pandas()
+
+
+def _iter_parquet(file, chunk_size, columns, lenient):
+    path = get_local_path(file)
+    parquet = pq.ParquetFile(path, memory_map=True) if path else pq.ParquetFile(file)
+    columns = _project(columns, parquet.schema_arrow.names)
+    schema = _arrow_schema(columns, lenient)
+    for batch in parquet.iter_batches(batch_size=chunk_size, columns=columns):
+        yield _to_frame(batch, schema)
+
+
+def _iter_arrow(file, head, chunk_size, columns, lenient):
+    """Read Arrow IPC batch by batch, each sliced (without copying) into ``chunk_size`` rows."""
+    path = get_local_path(file)
+    source = pa.memory_map(path, 'r') if path else file
+    if head.startswith(ARROW_FILE_MAGIC):
+        reader = pa_ipc.open_file(source)
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+    else:
+        reader = batches = pa_ipc.open_stream(source)
+    schema = _arrow_schema(_project(columns, reader.schema.names), lenient)
+    for batch in batches:
+        for start in range(0, batch.num_rows, chunk_size):
+            yield _to_frame(batch.slice(start, chunk_size), schema)
+
+
+def _release_consumed(mapped):
+    """Drop the mapped pages the parser has read past from this process's memory."""
+    # Not available on Windows, where the pages simply stay mapped
+    if hasattr(mmap, 'MADV_DONTNEED'):
+        end = mapped.tell() - mapped.tell() % mmap.PAGESIZE
+        if end:
+            mapped.madvise(mmap.MADV_DONTNEED, 0, end)
+
+
+def _iter_pandas(file, path, chunk_size, columns, lenient):
+    dtype = {column: DTYPES[column] for column in columns}
+    if lenient:
+        dtype.update({column: "object" for column in PARAMETERS.values() if column in dtype})
+    with contextlib.ExitStack() as stack:
+        source = file
+        if path is not None and os.path.getsize(path):
+            # Mapped here rather than with memory_map=True, so pages already
+            # parsed can be released and resident memory stays flat
+            raw = stack.enter_context(open(path, 'rb'))
+            source = stack.enter_context(mmap.mmap(raw.fileno(), 0, access=mmap.ACCESS_READ))
+        reader = stack.enter_context(pd.read_csv(
+            source, usecols=columns, dtype=dtype, engine='c', chunksize=chunk_size,
+        ))
+        for chunk in reader:
+            yield chunk
+            if source is not file:
+                _release_consumed(source)
+
+
+def _iter_columnar(file, head, chunk_size, columns, lenient):
+    if pa is None:
+        raise IngestError("Parquet and Arrow uploads require the 'pyarrow' package.")
+    if head.startswith(PARQUET_MAGIC):
+        yield from _iter_parquet(file, chunk_size, columns, lenient)
+    else:
+        yield from _iter_arrow(file, head, chunk_size, columns, lenient)
+
+
+def iter_chunks(file, chunk_size=None, columns=COLUMNS, lenient=False):
+    """
+    Yield the projected ``columns`` of an upload as DataFrame chunks.
+
+    Accepts CSV (plain or compressed), Parquet and Arrow IPC (file or stream).
+    OPTIONAL_COLUMNS the upload does not have are left out of the chunks.
+    With ``lenient`` the parameter columns are read as text instead of being
+    parsed as float64, so malformed values can be reported rather than
+    aborting the parse.
+    """
+    chunk_size = chunk_size or get_chunk_size()
+    file.seek(0)
+    head = file.read(8)
+    file.seek(0)
+    try:
+        if head.startswith((PARQUET_MAGIC, ARROW_FILE_MAGIC, ARROW_STREAM_MAGIC)):
+            yield from _iter_columnar(file, head, chunk_size, columns, lenient)
+            return
+        columns = _project(columns, _csv_header(file))
+        source = open_decompressed(file)
+        # Compressed input has to go through the decompressor stream
+        path = get_local_path(file) if source is file else None
+        if get_engine() == 'pyarrow':
+            yield from _iter_pyarrow(source, path, chunk_size, columns, lenient)
+        else:
+            yield from _iter_pandas(source, path, chunk_size, columns, lenient)
+    except IngestError:
+        raise
+    except (ValueError, KeyError) as exc:
+        # Missing columns and non-numeric parameter values
+        raise IngestError(f"Could not parse upload: {exc}") from exc
+    except DECOMPRESSION_ERRORS as exc:
+        raise IngestError(f"Could not decompress upload: {exc}") from exc
+
+
+def iter_numeric_chunks(file, chunk_size=None, columns=COLUMNS):
+    """
+    iter_chunks for uploads that passed validation. Malformed numbers that
+    validation lets through fail the typed parse; the rest of the file is then
+    re-read leniently, with those values as NaN, without repeating rows
+    already yielded.
+    """
+    done = 0
+    try:
+        for chunk in iter_chunks(file, chunk_size, columns):
+            yield chunk
+            done += len(chunk)
+        return
+    except IngestError:
+        pass
+    seen = 0
+    for chunk in iter_chunks(file, chunk_size, columns, lenient=True):
+        seen += len(chunk)
+        if seen <= done:
+            continue
+        chunk = chunk.iloc[max(done - seen + len(chunk), 0):].copy()
+        for column in PARAMETERS.values():
+            if column in chunk:
+                chunk[column] = pd.to_numeric(chunk[column], errors='coerce').astype('float64')
+        yield chunk
+
+
+def _chunk_moments(values):
+    """
+    Count, sum, M2, min and max of every column of a DataFrame (or of every
+    group of a GroupBy), computed column-wise. M2 is the sum of squared
+    deviations from the mean.
+    """
+    counts = values.count()
+    return [counts, values.sum(), (values.var(ddof=0) * counts).fillna(0.0), values.min(), values.max()]
+
+
+def _part(count, total, m2, low, high):
+    if not count:
+        return [0, 0.0, 0.0, None, None]
+    return [int(count), float(total), float(m2), float(low), float(high)]
+
+
+def _bound(pick, a, b):
+    values = [value for value in (a, b) if value is not None]
+    return pick(values) if values else None
+
+
+def _merge_moments(a, b):
+    """
+    Combine the moments of two disjoint sets of values (Chan et al.), which is
+    exact up to float rounding whatever the order the parts arrive in.
+    """
+    count_a, sum_a, m2_a, min_a, max_a = a
+    count_b, sum_b, m2_b, min_b, max_b = b
+    if not count_a:
+        return list(b)
+    if not count_b:
+        return list(a)
+    count = count_a + count_b
+    delta = sum_b / count_b - sum_a / count_a
+    return [
+        count,
+        sum_a + sum_b,
+        m2_a + m2_b + delta * delta * count_a * count_b / count,
+        _bound(min, min_a, min_b),
+        _bound(max, max_a, max_b),
+    ]
+
+
+def _load_moments(moments):
+    # States stored before min/max were tracked hold [count, sum, M2] only
+    return list(moments) + [None] * (5 - len(moments))
+
+
+def _empty_moments():
+    return {name: [0, 0.0, 0.0, None, None] for name in PARAMETERS}
+
+
+def _comoments(x, y):
+    """
+    [count, sum x, sum y, M2 x, M2 y, C] over the rows where both arrays are
+    present; C is the sum of products of deviations from the means.
+    """
+    present = ~(np.isnan(x) | np.isnan(y))
+    x, y = x[present], y[present]
+    count = len(x)
+    if not count:
+        return [0, 0.0, 0.0, 0.0, 0.0, 0.0]
+    sum_x, sum_y = float(x.sum()), float(y.sum())
+    dx, dy = x - sum_x / count, y - sum_y / count
+    return [count, sum_x, sum_y, float(dx @ dx), float(dy @ dy), float(dx @ dy)]
+
+
+def _merge_comoments(a, b):
+    count_a, sum_xa, sum_ya, m2_xa, m2_ya, c_a = a
+    count_b, sum_xb, sum_yb, m2_xb, m2_yb, c_b = b
+    if not count_a:
+        return list(b)
+    if not count_b:
+        return list(a)
+    count = count_a + count_b
+    dx = sum_xb / count_b - sum_xa / count_a
+    dy = sum_yb / count_b - sum_ya / count_a
+    weight = count_a * count_b / count
+    return [
+        count,
+        sum_xa + sum_xb,
+        sum_ya + sum_yb,
+        m2_xa + m2_xb + dx * dx * weight,
+        m2_ya + m2_yb + dy * dy * weight,
+        c_a + c_b + dx * dy * weight,
+    ]
+
+
+def _pair_key(pair):
+    return ":".join(pair)
+
+
+def describe_moments(moments, rows):
+    """Public statistics for one parameter from its [count, sum, M2, min, max]."""
+    count, total, m2, low, high = moments
+    variance = m2 / (count - 1) if count > 1 else None
+    return {
+        "count": count,
+        "nulls": rows - count,
+        "mean": total / count if count else None,
+        "min": low,
+        "max": high,
+        "var": variance,
+        "std": variance ** 0.5 if variance is not None else None,
+    }
+
+
+class SummaryAccumulator:
+    """
+    Running sufficient statistics over a stream of DataFrame chunks: row and
+    type counts plus count, sum, M2, min and max per parameter, overall and
+    per type, KLL quantile sketches per parameter, again overall and per type,
+    a HyperLogLog sketch of distinct equipment names, and co-moments of each
+    pair of parameters for the covariance and correlation matrices.
+
+    The state round-trips through JSON (``to_state``/``from_state``) and merges
+    associatively, so a stored dataset can be extended by parsing only the
+    new rows.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.moments = _empty_moments()
+        self.types = {}
+        self.type_moments = {}
+        # Missing for states stored before sketches were kept
+        self.sketches = {name: KLLSketch() for name in PARAMETERS}
+        self.type_sketches = {}
+        self.names = HyperLogLog()
+        self.comoments = {_pair_key(pair): [0, 0.0, 0.0, 0.0, 0.0, 0.0] for pair in PAIRS}
+
+    def update(self, chunk):
+        self.rows += len(chunk)
+        if self.names is not None:
+            if NAME_COLUMN in chunk:
+                self.names.update(chunk[NAME_COLUMN])
+            else:
+                # Distinct equipment is unknown for uploads without names
+                self.names = None
+        parameters = list(PARAMETERS.values())
+        stats = _chunk_moments(chunk[parameters])
+        for name, column in PARAMETERS.items():
+            part = _part(*(stat[column] for stat in stats))
+            self.moments[name] = _merge_moments(self.moments[name], part)
+            self.sketches[name].update(chunk[column].to_numpy())
+        if self.comoments is not None:
+            for pair in PAIRS:
+                x, y = (chunk[PARAMETERS[name]].to_numpy(dtype='float64') for name in pair)
+                key = _pair_key(pair)
+                self.comoments[key] = _merge_comoments(self.comoments[key], _comoments(x, y))
+        for type_name, count in chunk["Type"].value_counts().items():
+            # Categorical counts include categories absent from this chunk
+            if count:
+                self.types[type_name] = self.types.get(type_name, 0) + int(count)
+
+        grouped = chunk.groupby("Type", observed=True, sort=False)
+        stats = _chunk_moments(grouped[parameters])
+        for type_name in stats[0].index:
+            moments = self.type_moments.setdefault(type_name, _empty_moments())
+            for name, column in PARAMETERS.items():
+                part = _part(*(stat.at[type_name, column] for stat in stats))
+                moments[name] = _merge_moments(moments[name], part)
+
+        values = {name: chunk[column].to_numpy() for name, column in PARAMETERS.items()}
+        for type_name, positions in grouped.indices.items():
+            sketches = self.type_sketches.setdefault(
+                type_name, {name: KLLSketch() for name in PARAMETERS}
+            )
+            for name in PARAMETERS:
+                sketches[name].update(values[name][positions])
+
+    def to_state(self):
+        """JSON-serialisable form of the accumulator, stored as EquipmentSummary.stats."""
+        types = {}
+        for type_name, count in self.types.items():
+            types[type_name] = {
+                "count": count,
+                "parameters": self.type_moments.get(type_name, _empty_moments()),
+            }
+            if type_name in self.type_sketches:
+                types[type_name]["sketches"] = {
+                    name: sketch.to_state() for name, sketch in self.type_sketches[type_name].items()
+                }
+        return {
+            "rows": self.rows,
+            "parameters": self.moments,
+            "types": types,
+            "sketches": {name: sketch.to_state() for name, sketch in self.sketches.items()},
+            "names": self.names.to_state() if self.names is not None else None,
+            "comoments": self.comoments,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        accumulator = cls()
+        accumulator.rows = state["rows"]
+        accumulator.moments = {name: _load_moments(state["parameters"][name]) for name in PARAMETERS}
+        for type_name, entry in state["types"].items():
+            accumulator.types[type_name] = entry["count"]
+            accumulator.type_moments[type_name] = {
+                name: _load_moments(entry["parameters"][name]) for name in PARAMETERS
+            }
+            if "sketches" in entry:
+                accumulator.type_sketches[type_name] = {
+                    name: KLLSketch.from_state(sketch) for name, sketch in entry["sketches"].items()
+                }
+        accumulator.sketches = {
+            name: KLLSketch.from_state(sketch) for name, sketch in state.get("sketches", {}).items()
+        }
+        names = state.get("names")
+        accumulator.names = HyperLogLog.from_state(names) if names else None
+        comoments = state.get("comoments")
+        accumulator.comoments = {key: list(value) for key, value in comoments.items()} if comoments else None
+        return accumulator
+
+    @classmethod
+    def from_summary(cls, summary):
+        """
+        Rebuild an accumulator from a stored EquipmentSummary. Summaries saved
+        before statistics were kept only have their averages, so parameter
+        counts are taken to be total_equipment and spread and range are unknown.
+        """
+        if summary.stats:
+            return cls.from_state(summary.stats)
+        accumulator = cls()
+        accumulator.rows = summary.total_equipment
+        for name in PARAMETERS:
+            mean = getattr(summary, f"avg_{name}")
+            total = summary.total_equipment
+            accumulator.moments[name] = _load_moments([total, mean * total, 0.0])
+        accumulator.types = dict(summary.type_distribution)
+        accumulator.sketches = {}
+        accumulator.names = None
+        accumulator.comoments = None
+        return accumulator
+
+    def merge(self, other):
+        """Fold another accumulator (e.g. from a different file) into this one."""
+        # A type's sketches are only kept if every side with rows of that type has them
+        for type_name in set(self.types) | set(other.types):
+            sides = [side for side in (self, other) if type_name in side.types]
+            if not all(type_name in side.type_sketches for side in sides):
+                self.type_sketches.pop(type_name, None)
+                continue
+            ours = self.type_sketches.setdefault(type_name, {name: KLLSketch() for name in PARAMETERS})
+            if type_name in other.type_sketches:
+                for name, sketch in other.type_sketches[type_name].items():
+                    ours[name].merge(sketch)
+
+        self.rows += other.rows
+        for name in PARAMETERS:
+            self.moments[name] = _merge_moments(self.moments[name], other.moments[name])
+        for type_name, count in other.types.items():
+            self.types[type_name] = self.types.get(type_name, 0) + count
+        for type_name, theirs in other.type_moments.items():
+            ours = self.type_moments.setdefault(type_name, _empty_moments())
+            for name in PARAMETERS:
+                ours[name] = _merge_moments(ours[name], theirs[name])
+        # A parameter's quantiles are only known if both sides have a sketch
+        self.sketches = {
+            name: sketch.merge(other.sketches[name])
+            for name, sketch in self.sketches.items() if name in other.sketches
+        }
+        if self.names is not None and other.names is not None:
+            self.names.merge(other.names)
+        elif other.rows:
+            self.names = None
+        if self.comoments is not None and other.comoments is not None:
+            for key, theirs in other.comoments.items():
+                self.comoments[key] = _merge_comoments(self.comoments[key], theirs)
+        elif other.rows:
+            self.comoments = None
+        return self
+
+    def mean(self, name):
+        count, total = self.moments[name][:2]
+        return total / count if count else float('nan')
+
+    def parameter_stats(self):
+        stats = {name: describe_moments(self.moments[name], self.rows) for name in PARAMETERS}
+        for name, sketch in self.sketches.items():
+            for q, value in zip(DEFAULT_QUANTILES, sketch.quantiles(DEFAULT_QUANTILES)):
+                stats[name][f"p{round(q * 100)}"] = value
+        return stats
+
+    def correlations(self):
+        """
+        Sample covariance and Pearson correlation matrices over PARAMETERS.
+        Off-diagonal entries use rows where both parameters are present, as
+        DataFrame.cov()/corr() do. None where undefined, or for the whole
+        result if any merged part predates co-moments.
+        """
+        if self.comoments is None:
+            return None
+        names = list(PARAMETERS)
+        covariance = [[None] * len(names) for _ in names]
+        correlation = [[None] * len(names) for _ in names]
+        for i, name in enumerate(names):
+            count, _, m2 = self.moments[name][:3]
+            if count > 1:
+                covariance[i][i] = m2 / (count - 1)
+                correlation[i][i] = 1.0 if m2 > 0 else None
+        for pair in PAIRS:
+            i, j = names.index(pair[0]), names.index(pair[1])
+            count, _, _, m2_x, m2_y, c = self.comoments[_pair_key(pair)]
+            if count > 1:
+                covariance[i][j] = covariance[j][i] = c / (count - 1)
+            if m2_x > 0 and m2_y > 0:
+                correlation[i][j] = correlation[j][i] = c / math.sqrt(m2_x * m2_y)
+        return {"parameters": names, "covariance": covariance, "correlation": correlation}
+
+    def type_stats(self, types):
+        """Row count plus count, mean, min and max of each parameter, per type."""
+        stats = {}
+        for type_name, count in types:
+            moments = self.type_moments.get(type_name)
+            if moments is None:
+                continue
+            stats[type_name] = {"count": count}
+            for name in PARAMETERS:
+                described = describe_moments(moments[name], count)
+                stats[type_name][name] = {key: described[key] for key in ("count", "mean", "min", "max")}
+        return stats
+
+    def summary(self):
+        # Same ordering as Series.value_counts(): most frequent first
+        types = sorted(self.types.items(), key=lambda item: item[1], reverse=True)
+        return {
+            "total_equipment": self.rows,
+            "avg_flowrate": self.mean("flowrate"),
+            "avg_pressure": self.mean("pressure"),
+            "avg_temperature": self.mean("temperature"),
+            "type_distribution": dict(types),
+            # Estimated from the HyperLogLog sketch; None if any part predates it
+            "distinct_equipment": self.names.count() if self.names is not None else None,
+            "distinct_types": len(self.types),
+            "parameter_stats": self.parameter_stats(),
+            "type_stats": self.type_stats(types),
+            "correlations": self.correlations(),
+        }
+
+    def histograms(self):
+        """
+        Fixed-width and quantile histograms per parameter, overall and per
+        type, estimated from the sketches. Uploads replace the fixed-width
+        counts with exact ones once the file is read again for outliers (see
+        FixedHistogramCounter); appended datasets keep the estimates.
+        """
+        def describe(sketches):
+            return {
+                name: {kind: sketch.histogram(kind=kind) for kind in HISTOGRAM_KINDS}
+                for name, sketch in sketches.items()
+            }
+        return {
+            "parameters": describe(self.sketches),
+            "types": {type_name: describe(sketches) for type_name, sketches in self.type_sketches.items()},
+        }
+
+    def fields(self):
+        """Everything stored on an EquipmentSummary: the summary plus derived data and state."""
+        return {**self.summary(), "histograms": self.histograms(), "stats": self.to_state()}
+
+
+class FixedHistogramCounter:
+    """
+    Exact counts for the fixed-width bins of stored histograms (as built by
+    SummaryAccumulator.histograms), taken over a second read of the upload.
+    The sketches only estimate them, which can leave sparse tail bins wrong.
+    """
+
+    def __init__(self, histograms):
+        self.histograms = copy.deepcopy(histograms)
+        self.bins = {}
+        for name, kinds in self.histograms["parameters"].items():
+            self._track(None, name, kinds)
+        for type_name, parameters in self.histograms["types"].items():
+            for name, kinds in parameters.items():
+                self._track(type_name, name, kinds)
+
+    def _track(self, type_name, name, kinds):
+        fixed = kinds.get('fixed')
+        if fixed is not None:
+            fixed["counts"] = [0] * (len(fixed["edges"]) - 1)
+            self.bins[type_name, name] = fixed
+
+    def _count(self, type_name, name, values):
+        fixed = self.bins.get((type_name, name))
+        if fixed is None:
+            return
+        values = values[~np.isnan(values)]
+        if values.size:
+            counts, _ = np.histogram(values, bins=fixed["edges"])
+            fixed["counts"] = (counts + fixed["counts"]).tolist()
+
+    def update(self, chunk):
+        values = {name: chunk[column].to_numpy(dtype='float64') for name, column in PARAMETERS.items()}
+        for name in PARAMETERS:
+            self._count(None, name, values[name])
+        for type_name, positions in chunk.groupby("Type", observed=True, sort=False).indices.items():
+            for name in PARAMETERS:
+                self._count(type_name, name, values[name][positions])
+
+
+def accumulate(file, chunk_size=None, columns=COLUMNS, on_chunk=None, validator=None):
+    """
+    Fold an upload into a SummaryAccumulator. ``on_chunk`` is called with each
+    parsed chunk, e.g. to persist rows while the file is streamed.
+
+    With a ``validator`` every chunk is checked as well and an IngestError
+    carrying the validation report is raised if the upload is rejected. If the
+    fast typed parse fails outright, the file is re-read leniently so the
+    report covers every malformed value rather than just the first one.
+    """
+    accumulator = SummaryAccumulator()
+    try:
+        for chunk in iter_chunks(file, chunk_size, columns):
+            if validator is not None:
+                validator.check(chunk)
+                if validator.rejected:
+                    # Keep checking, but stop aggregating and persisting
+                    continue
+            accumulator.update(chunk)
+            if on_chunk is not None:
+                on_chunk(chunk)
+        if validator is not None:
+            validator.finish()
+    except IngestError:
+        if validator is None:
+            raise
+        validator.reset()
+        for chunk in iter_chunks(file, chunk_size, columns, lenient=True):
+            validator.check(chunk)
+        validator.finish()
+        if not validator.rejected:
+            raise
+
+    if validator is not None and validator.rejected:
+        raise IngestError("Upload failed validation.", errors=validator.report())
+    return accumulator
+
+
+def summarize_csv(file, chunk_size=None):
+    return accumulate(file, chunk_size).summary()
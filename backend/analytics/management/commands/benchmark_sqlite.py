@@ -0,0 +1,289 @@
+"""
+Concurrency benchmark for the SQLite profile in settings.DATABASES.
+
+Writer threads mimic uploads (a summary row plus a large batch of equipment
+rows per transaction) while reader threads mimic dashboard polling. The same
+workload runs against a scratch database twice: once with SQLite's defaults
+(rollback journal, deferred transactions) and once with the configured
+OPTIONS. Reader latency and "database is locked" errors are reported for
+each, so the effect of WAL on reads during uploads can be seen directly.
+
+With ``--pipeline`` the writers instead call pipeline.process_upload on a
+generated CSV, against a temporary test database built from the migrations,
+while other threads poll summaries and create upload sessions as the views
+do. It runs once through the write queue and once with writes on the calling
+threads, reporting upload times, read and session latency, and errors.
+
+    python manage.py benchmark_sqlite --writers 2 --readers 4 --seconds 5
+    python manage.py benchmark_sqlite --pipeline --records
+"""
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection
+from django.test.utils import override_settings, setup_databases, teardown_databases
+
+SCHEMA = """
+CREATE TABLE summary (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    uploaded_at REAL NOT NULL,
+    total_equipment INTEGER NOT NULL,
+    avg_pressure REAL NOT NULL
+);
+CREATE INDEX summary_uploaded_at ON summary (uploaded_at);
+CREATE TABLE record (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    summary_id INTEGER NOT NULL REFERENCES summary (id),
+    type TEXT,
+    pressure REAL
+);
+CREATE INDEX record_summary_type ON record (summary_id, type);
+"""
+TYPES = ['Pump', 'Valve', 'Compressor', 'Reactor', 'Heat Exchanger', 'Condenser']
+READ_SQL = 'SELECT id, total_equipment, avg_pressure FROM summary ORDER BY uploaded_at DESC LIMIT 5'
+CSV_HEADER = 'Equipment Name,Type,Flowrate,Pressure,Temperature\n'
+
+
+def connect(path, profile):
+    connection = sqlite3.connect(
+        path, timeout=profile["timeout"], isolation_level=None, check_same_thread=False,
+    )
+    if profile["init_command"]:
+        connection.executescript(profile["init_command"])
+    return connection
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def write_csv(path, rows):
+    rng = random.Random(0)
+    with open(path, 'w') as file:
+        file.write(CSV_HEADER)
+        for index in range(rows):
+            file.write(
+                f'E{index},{rng.choice(TYPES)},{rng.gauss(100, 15):.3f},'
+                f'{rng.gauss(5, 1):.3f},{rng.gauss(100, 8):.2f}\n'
+            )
+
+
+class Command(BaseCommand):
+    help = "Compare reader latency during uploads with default and configured SQLite settings."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--rows', type=int, default=50_000, help="Rows written per upload.")
+        parser.add_argument('--seconds', type=float, default=5.0)
+        parser.add_argument(
+            '--pipeline', action='store_true',
+            help="Drive process_upload against a temporary copy of the schema.",
+        )
+        parser.add_argument(
+            '--records', action='store_true',
+            help="With --pipeline, also store every row (ANALYTICS_STORE_RECORDS).",
+        )
+
+    def handle(self, *args, **options):
+        if options['pipeline']:
+            return self.handle_pipeline(options)
+        configured = settings.DATABASES['default'].get('OPTIONS', {})
+        profiles = [
+            ("default", {"init_command": "", "timeout": 5, "transaction_mode": "DEFERRED"}),
+            ("configured", {
+                "init_command": configured.get('init_command', ''),
+                "timeout": configured.get('timeout', 5),
+                "transaction_mode": configured.get('transaction_mode') or 'DEFERRED',
+            }),
+        ]
+        self.stdout.write(
+            f"{'profile':<12}{'reads':>8}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}"
+            f"{'read errs':>11}{'uploads':>9}{'write errs':>12}"
+        )
+        for name, profile in profiles:
+            result = self.run_profile(profile, options)
+            reads = result["reads"]
+            self.stdout.write(
+                f"{name:<12}{len(reads):>8}"
+                f"{_percentile(reads, 0.5) or 0:>9.1f}{_percentile(reads, 0.95) or 0:>9.1f}"
+                f"{max(reads, default=0):>9.1f}{result['read_errors']:>11}"
+                f"{result['writes']:>9}{result['write_errors']:>12}"
+            )
+
+    def run_profile(self, profile, options):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bench.sqlite3')
+            setup = connect(path, profile)
+            setup.executescript(SCHEMA)
+            setup.close()
+
+            stop = threading.Event()
+            lock = threading.Lock()
+            result = {"reads": [], "read_errors": 0, "writes": 0, "write_errors": 0}
+
+            def write():
+                connection = connect(path, profile)
+                rng = random.Random()
+                while not stop.is_set():
+                    rows = [
+                        (rng.choice(TYPES), rng.gauss(5, 1)) for _ in range(options['rows'])
+                    ]
+                    try:
+                        connection.execute(f"BEGIN {profile['transaction_mode']}")
+                        summary_id = connection.execute(
+                            'INSERT INTO summary (uploaded_at, total_equipment, avg_pressure) VALUES (?, ?, ?)',
+                            (time.time(), len(rows), statistics.fmean(row[1] for row in rows)),
+                        ).lastrowid
+                        connection.executemany(
+                            'INSERT INTO record (summary_id, type, pressure) VALUES (?, ?, ?)',
+                            [(summary_id, *row) for row in rows],
+                        )
+                        connection.execute('COMMIT')
+                        with lock:
+                            result["writes"] += 1
+                    except sqlite3.OperationalError:
+                        if connection.in_transaction:
+                            connection.execute('ROLLBACK')
+                        with lock:
+                            result["write_errors"] += 1
+                connection.close()
+
+            def read():
+                connection = connect(path, profile)
+                while not stop.is_set():
+                    start = time.perf_counter()
+                    try:
+                        connection.execute(READ_SQL).fetchall()
+                        elapsed = (time.perf_counter() - start) * 1000
+                        with lock:
+                            result["reads"].append(elapsed)
+                    except sqlite3.OperationalError:
+                        with lock:
+                            result["read_errors"] += 1
+                    time.sleep(0.001)
+                connection.close()
+
+            threads = (
+                [threading.Thread(target=write) for _ in range(options['writers'])]
+                + [threading.Thread(target=read) for _ in range(options['readers'])]
+            )
+            for thread in threads:
+                thread.start()
+            time.sleep(options['seconds'])
+            stop.set()
+            for thread in threads:
+                thread.join()
+        return result
+
+    def handle_pipeline(self, options):
+        self.stdout.write(
+            f"{'profile':<10}{'uploads':>9}{'p50 s':>8}{'max s':>8}{'upload errs':>13}"
+            f"{'reads':>8}{'p95 ms':>9}{'max ms':>9}{'read errs':>11}"
+            f"{'sessions':>10}{'p95 ms':>9}{'max ms':>9}{'session errs':>14}"
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            csv_path = os.path.join(directory, 'upload.csv')
+            write_csv(csv_path, options['rows'])
+            connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'bench.sqlite3')
+            old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+            try:
+                with override_settings(
+                    MEDIA_ROOT=os.path.join(directory, 'media'),
+                    CACHES={'default': {
+                        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                        'LOCATION': os.path.join(directory, 'cache'),
+                    }},
+                    ANALYTICS_STORE_RECORDS=options['records'],
+                ):
+                    for name, enabled in (("queued", True), ("direct", False)):
+                        with override_settings(ANALYTICS_WRITE_QUEUE={'enabled': enabled}):
+                            result = self.run_pipeline(csv_path, options)
+                        uploads, reads, sessions = result["uploads"], result["reads"], result["sessions"]
+                        self.stdout.write(
+                            f"{name:<10}{len(uploads):>9}"
+                            f"{_percentile(uploads, 0.5) or 0:>8.2f}{max(uploads, default=0):>8.2f}"
+                            f"{result['upload_errors']:>13}{len(reads):>8}"
+                            f"{_percentile(reads, 0.95) or 0:>9.1f}{max(reads, default=0):>9.1f}"
+                            f"{result['read_errors']:>11}{len(sessions):>10}"
+                            f"{_percentile(sessions, 0.95) or 0:>9.1f}{max(sessions, default=0):>9.1f}"
+                            f"{result['session_errors']:>14}"
+                        )
+                        for error in sorted(result["messages"]):
+                            self.stdout.write(f"  {error}")
+            finally:
+                connection.close()
+                teardown_databases(old_config, verbosity=0)
+
+    def run_pipeline(self, csv_path, options):
+        from analytics.models import EquipmentSummary, UploadSession
+        from analytics.pipeline import process_upload
+        from analytics.writequeue import run_write
+
+        stop = threading.Event()
+        lock = threading.Lock()
+        result = {
+            "uploads": [], "upload_errors": 0, "reads": [], "read_errors": 0,
+            "sessions": [], "session_errors": 0, "messages": set(),
+        }
+
+        def timed(kind, scale, func):
+            """Run ``func`` and record its duration (times ``scale``) or its error under ``kind``."""
+            start = time.perf_counter()
+            try:
+                func()
+            except DatabaseError as exc:
+                with lock:
+                    result[f"{kind}_errors"] += 1
+                    result["messages"].add(f"{kind}: {exc}")
+                return
+            elapsed = (time.perf_counter() - start) * scale
+            with lock:
+                result[f"{kind}s"].append(elapsed)
+
+        def upload():
+            def once():
+                with open(csv_path, 'rb') as file:
+                    process_upload(file, force=True)
+            while not stop.is_set():
+                timed("upload", 1, once)
+            connection.close()
+
+        def read():
+            def once():
+                list(EquipmentSummary.objects.order_by('-uploaded_at').values_list('id', 'total_equipment')[:5])
+            while not stop.is_set():
+                timed("read", 1000, once)
+                time.sleep(0.001)
+            connection.close()
+
+        def create_session():
+            def once():
+                run_write(UploadSession.objects.create, filename='upload.csv', size=0)
+            while not stop.is_set():
+                timed("session", 1000, once)
+                time.sleep(0.01)
+            connection.close()
+
+        threads = (
+            [threading.Thread(target=upload) for _ in range(options['writers'])]
+            + [threading.Thread(target=read) for _ in range(options['readers'])]
+            + [threading.Thread(target=create_session)]
+        )
+        for thread in threads:
+            thread.start()
+        time.sleep(options['seconds'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return result
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-17 03:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0003_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='equipmentsummary',
+            name='content_sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='uploadjob',
+            name='force',
+            field=models.BooleanField(default=False),
+        ),
+    ]
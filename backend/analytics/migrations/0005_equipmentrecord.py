@@ -0,0 +1,29 @@
+# Generated by Django 6.0.1 on 2026-10-17 03:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0004_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EquipmentRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('equipment_name', models.CharField(blank=True, max_length=255, null=True)),
+                ('type', models.CharField(blank=True, max_length=100, null=True)),
+                ('flowrate', models.FloatField(blank=True, null=True)),
+                ('pressure', models.FloatField(blank=True, null=True)),
+                ('temperature', models.FloatField(blank=True, null=True)),
+                ('summary', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='records', to='analytics.equipmentsummary')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['summary', 'type'], name='analytics_e_summary_f371bc_idx'), models.Index(fields=['summary', 'flowrate'], name='analytics_e_summary_6bb6d0_idx'), models.Index(fields=['summary', 'pressure'], name='analytics_e_summary_5a2ce6_idx'), models.Index(fields=['summary', 'temperature'], name='analytics_e_summary_cae0d9_idx')],
+            },
+        ),
+    ]
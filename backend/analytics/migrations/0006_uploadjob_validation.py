@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-17 03:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0005_equipmentrecord'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadjob',
+            name='validation',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
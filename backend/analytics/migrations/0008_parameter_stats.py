@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-17 03:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0007_summary_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='equipmentsummary',
+            name='parameter_stats',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-17 03:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0009_type_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='equipmentsummary',
+            name='histograms',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 6.0.1 on 2026-10-17 03:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0010_histograms'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FleetAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stats', models.JSONField(default=dict)),
+                ('uploads', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
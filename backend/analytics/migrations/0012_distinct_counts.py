@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-17 03:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0011_fleetaggregate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='equipmentsummary',
+            name='distinct_equipment',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='equipmentsummary',
+            name='distinct_types',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-17 03:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0012_distinct_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='equipmentsummary',
+            name='correlations',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
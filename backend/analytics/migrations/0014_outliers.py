@@ -0,0 +1,33 @@
+# Generated by Django 6.0.1 on 2026-10-17 03:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0013_correlations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='equipmentsummary',
+            name='outlier_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='OutlierRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row', models.PositiveBigIntegerField()),
+                ('equipment_name', models.CharField(blank=True, max_length=255, null=True)),
+                ('type', models.CharField(blank=True, max_length=100, null=True)),
+                ('flowrate', models.FloatField(blank=True, null=True)),
+                ('pressure', models.FloatField(blank=True, null=True)),
+                ('temperature', models.FloatField(blank=True, null=True)),
+                ('flags', models.PositiveSmallIntegerField()),
+                ('summary', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='outliers', to='analytics.equipmentsummary')),
+            ],
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 6.0.1 on 2026-10-17 03:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0015_retention'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TypeStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uploaded_at', models.DateTimeField()),
+                ('type', models.CharField(max_length=100)),
+                ('count', models.IntegerField()),
+                ('flowrate_count', models.IntegerField(blank=True, null=True)),
+                ('flowrate_sum', models.FloatField(blank=True, null=True)),
+                ('flowrate_min', models.FloatField(blank=True, null=True)),
+                ('flowrate_max', models.FloatField(blank=True, null=True)),
+                ('pressure_count', models.IntegerField(blank=True, null=True)),
+                ('pressure_sum', models.FloatField(blank=True, null=True)),
+                ('pressure_min', models.FloatField(blank=True, null=True)),
+                ('pressure_max', models.FloatField(blank=True, null=True)),
+                ('temperature_count', models.IntegerField(blank=True, null=True)),
+                ('temperature_sum', models.FloatField(blank=True, null=True)),
+                ('temperature_min', models.FloatField(blank=True, null=True)),
+                ('temperature_max', models.FloatField(blank=True, null=True)),
+                ('summary', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='type_rows', to='analytics.equipmentsummary')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['type', 'uploaded_at'], name='analytics_t_type_d5f517_idx')],
+            },
+        ),
+    ]
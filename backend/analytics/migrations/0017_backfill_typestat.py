@@ -0,0 +1,39 @@
+# Generated by Django 6.0.1 on 2026-10-17 03:48
+
+from django.db import migrations
+
+PARAMETERS = ['flowrate', 'pressure', 'temperature']
+
+
+def backfill(apps, schema_editor):
+    EquipmentSummary = apps.get_model('analytics', 'EquipmentSummary')
+    TypeStat = apps.get_model('analytics', 'TypeStat')
+    rows = []
+    for summary in EquipmentSummary.objects.only('uploaded_at', 'type_distribution', 'type_stats').iterator():
+        for type_name, count in summary.type_distribution.items():
+            row = TypeStat(summary_id=summary.pk, uploaded_at=summary.uploaded_at, type=type_name, count=count)
+            stats = summary.type_stats.get(type_name)
+            if stats is not None:
+                for name in PARAMETERS:
+                    described = stats[name]
+                    setattr(row, f'{name}_count', described['count'])
+                    setattr(row, f'{name}_sum', described['mean'] * described['count'] if described['count'] else 0.0)
+                    setattr(row, f'{name}_min', described['min'])
+                    setattr(row, f'{name}_max', described['max'])
+            rows.append(row)
+    TypeStat.objects.bulk_create(rows, batch_size=1000)
+
+
+def clear(apps, schema_editor):
+    apps.get_model('analytics', 'TypeStat').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0016_typestat'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, clear),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 6.0.1 on 2026-10-17 03:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0017_backfill_typestat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day'), ('week', 'Week')], max_length=10)),
+                ('bucket_start', models.DateTimeField()),
+                ('uploads', models.PositiveIntegerField(default=0)),
+                ('rows', models.BigIntegerField(default=0)),
+                ('flowrate_count', models.BigIntegerField(default=0)),
+                ('flowrate_sum', models.FloatField(default=0.0)),
+                ('flowrate_min', models.FloatField(blank=True, null=True)),
+                ('flowrate_max', models.FloatField(blank=True, null=True)),
+                ('pressure_count', models.BigIntegerField(default=0)),
+                ('pressure_sum', models.FloatField(default=0.0)),
+                ('pressure_min', models.FloatField(blank=True, null=True)),
+                ('pressure_max', models.FloatField(blank=True, null=True)),
+                ('temperature_count', models.BigIntegerField(default=0)),
+                ('temperature_sum', models.FloatField(default=0.0)),
+                ('temperature_min', models.FloatField(blank=True, null=True)),
+                ('temperature_max', models.FloatField(blank=True, null=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('granularity', 'bucket_start'), name='unique_trend_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 6.0.1 on 2026-10-17 03:52
+
+from datetime import timedelta
+
+from django.db import migrations
+from django.utils import timezone
+
+PARAMETERS = ['flowrate', 'pressure', 'temperature']
+GRANULARITIES = ['hour', 'day', 'week']
+
+
+def bucket_start(moment, granularity):
+    start = timezone.localtime(moment).replace(tzinfo=None, minute=0, second=0, microsecond=0)
+    if granularity != 'hour':
+        start = start.replace(hour=0)
+    if granularity == 'week':
+        start -= timedelta(days=start.weekday())
+    return timezone.make_aware(start)
+
+
+def backfill(apps, schema_editor):
+    """Seed the trend buckets from the summaries still stored."""
+    EquipmentSummary = apps.get_model('analytics', 'EquipmentSummary')
+    TrendRollup = apps.get_model('analytics', 'TrendRollup')
+    buckets = {}
+    for summary in EquipmentSummary.objects.iterator():
+        moments = summary.stats.get('parameters') if summary.stats else None
+        for granularity in GRANULARITIES:
+            key = (granularity, bucket_start(summary.uploaded_at, granularity))
+            rollup = buckets.setdefault(key, TrendRollup(granularity=key[0], bucket_start=key[1]))
+            rollup.uploads += 1
+            rollup.rows += summary.total_equipment
+            for name in PARAMETERS:
+                if moments is not None:
+                    count, total, _, low, high = (list(moments[name]) + [None, None])[:5]
+                else:
+                    # Only the average was kept before stored statistics
+                    count, low, high = summary.total_equipment, None, None
+                    total = getattr(summary, f'avg_{name}') * count
+                setattr(rollup, f'{name}_count', getattr(rollup, f'{name}_count') + count)
+                setattr(rollup, f'{name}_sum', getattr(rollup, f'{name}_sum') + total)
+                for bound, value, pick in ((f'{name}_min', low, min), (f'{name}_max', high, max)):
+                    current = getattr(rollup, bound)
+                    if value is not None:
+                        setattr(rollup, bound, value if current is None else pick(current, value))
+    TrendRollup.objects.bulk_create(buckets.values())
+
+
+def clear(apps, schema_editor):
+    apps.get_model('analytics', 'TrendRollup').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0018_trendrollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, clear),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 6.0.1 on 2026-10-17 04:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def mark_loaded(apps, schema_editor):
+    # Rows stored so far were written in the same transaction as their summary
+    EquipmentSummary = apps.get_model('analytics', 'EquipmentSummary')
+    EquipmentRecord = apps.get_model('analytics', 'EquipmentRecord')
+    EquipmentSummary.objects.filter(pk__in=EquipmentRecord.objects.values('summary')).update(records_loaded=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0019_backfill_trendrollup'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='equipmentrecord',
+            name='analytics_e_summary_6bb6d0_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='equipmentrecord',
+            name='analytics_e_summary_5a2ce6_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='equipmentrecord',
+            name='analytics_e_summary_cae0d9_idx',
+        ),
+        migrations.AddField(
+            model_name='equipmentsummary',
+            name='records_loaded',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='equipmentrecord',
+            name='summary',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='records', to='analytics.equipmentsummary'),
+        ),
+        migrations.RunPython(mark_loaded, migrations.RunPython.noop),
+    ]
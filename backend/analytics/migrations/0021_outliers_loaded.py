@@ -0,0 +1,25 @@
+# Generated by Django 6.0.1 on 2026-10-17 04:37
+
+from django.db import migrations, models
+
+
+def mark_loaded(apps, schema_editor):
+    # Outliers stored so far were written in the same transaction as their summary
+    EquipmentSummary = apps.get_model('analytics', 'EquipmentSummary')
+    EquipmentSummary.objects.update(outliers_loaded=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0020_record_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='equipmentsummary',
+            name='outliers_loaded',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_loaded, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,219 @@
+import uuid
+from pathlib import Path
+
+from django.conf import settings
 from django.db import models
 
 
 class EquipmentSummary(models.Model):
-    uploaded_at = models.DateTimeField(auto_now_add=True)
+    uploaded_at = models.DateTimeField(auto_now_add=True, db_index=True)
     total_equipment = models.IntegerField()
     avg_flowrate = models.FloatField()
     avg_pressure = models.FloatField()
     avg_temperature = models.FloatField()
-    type_distribution = models.JSONField()
\ No newline at end of file
+    type_distribution = models.JSONField()
+    # Distinct equipment names (HyperLogLog estimate) and distinct types
+    distinct_equipment = models.IntegerField(null=True, blank=True)
+    distinct_types = models.IntegerField(null=True, blank=True)
+    outlier_count = models.IntegerField(default=0)
+    # Set once the outlier scan, which runs after the summary commits, is stored
+    outliers_loaded = models.BooleanField(default=False)
+    # Set once every row is in EquipmentRecord; rows load after the summary commits
+    records_loaded = models.BooleanField(default=False)
+    # count, nulls, mean, min, max, var and std per parameter
+    parameter_stats = models.JSONField(default=dict, blank=True)
+    # Row count plus count, mean, min and max per parameter, for each type
+    type_stats = models.JSONField(default=dict, blank=True)
+    content_sha256 = models.CharField(max_length=64, blank=True, db_index=True)
+    # Covariance and correlation matrices between the parameters
+    correlations = models.JSONField(null=True, blank=True)
+    # Histogram bins per parameter (and per type) for charts
+    histograms = models.JSONField(default=dict, blank=True)
+    # SummaryAccumulator state, so rows can be appended without a full recompute
+    stats = models.JSONField(default=dict, blank=True)
+
+
+class TypeStat(models.Model):
+    """
+    One equipment type's counts in one upload, normalised out of
+    ``type_distribution``/``type_stats`` so cross-upload questions are plain
+    indexed SQL aggregates. Rows outlive their summary when retention trims it.
+    """
+
+    summary = models.ForeignKey(
+        EquipmentSummary, null=True, blank=True, related_name='type_rows', on_delete=models.SET_NULL,
+    )
+    # Copied from the summary so (type, uploaded_at) can be indexed
+    uploaded_at = models.DateTimeField()
+    type = models.CharField(max_length=100)
+    count = models.IntegerField()
+    # Non-null values, their sum, min and max per parameter (null before type_stats were kept)
+    flowrate_count = models.IntegerField(null=True, blank=True)
+    flowrate_sum = models.FloatField(null=True, blank=True)
+    flowrate_min = models.FloatField(null=True, blank=True)
+    flowrate_max = models.FloatField(null=True, blank=True)
+    pressure_count = models.IntegerField(null=True, blank=True)
+    pressure_sum = models.FloatField(null=True, blank=True)
+    pressure_min = models.FloatField(null=True, blank=True)
+    pressure_max = models.FloatField(null=True, blank=True)
+    temperature_count = models.IntegerField(null=True, blank=True)
+    temperature_sum = models.FloatField(null=True, blank=True)
+    temperature_min = models.FloatField(null=True, blank=True)
+    temperature_max = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['type', 'uploaded_at']),
+        ]
+
+
+class OutlierRow(models.Model):
+    """An uploaded row flagged as an outlier; ``flags`` has one bit per (parameter, test)."""
+
+    summary = models.ForeignKey(EquipmentSummary, related_name='outliers', on_delete=models.CASCADE)
+    row = models.PositiveBigIntegerField()
+    equipment_name = models.CharField(max_length=255, null=True, blank=True)
+    type = models.CharField(max_length=100, null=True, blank=True)
+    flowrate = models.FloatField(null=True, blank=True)
+    pressure = models.FloatField(null=True, blank=True)
+    temperature = models.FloatField(null=True, blank=True)
+    flags = models.PositiveSmallIntegerField()
+
+
+class FleetAggregate(models.Model):
+    """Merged statistics of every upload stored so far, kept up to date as uploads land."""
+
+    stats = models.JSONField(default=dict)
+    uploads = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class SummaryRollup(models.Model):
+    """
+    Merged statistics of the summaries uploaded in one hour or day, kept after
+    they are trimmed. Rows hold full SummaryAccumulator state (moments,
+    sketches, co-moments), so trimmed history can still be merged exactly, but
+    only cover summaries that retention has removed.
+    """
+
+    HOUR = 'hour'
+    DAY = 'day'
+    GRANULARITY_CHOICES = [
+        (HOUR, 'Hour'),
+        (DAY, 'Day'),
+    ]
+
+    granularity = models.CharField(max_length=10, choices=GRANULARITY_CHOICES)
+    bucket_start = models.DateTimeField()
+    uploads = models.PositiveIntegerField(default=0)
+    stats = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['granularity', 'bucket_start'], name='unique_rollup_bucket'),
+        ]
+
+
+class TrendRollup(models.Model):
+    """
+    Counts and sums of everything uploaded in one hour, day or week, upserted
+    as each upload lands so trend charts read one row per bucket.
+
+    Unlike SummaryRollup this covers every upload, stored or trimmed, and keeps
+    only scalar columns that a single SQL upsert can add to, rather than state
+    that has to be decoded and merged in Python. Both use the same buckets
+    (see timebuckets).
+    """
+
+    HOUR = 'hour'
+    DAY = 'day'
+    WEEK = 'week'
+    GRANULARITY_CHOICES = [
+        (HOUR, 'Hour'),
+        (DAY, 'Day'),
+        (WEEK, 'Week'),
+    ]
+
+    granularity = models.CharField(max_length=10, choices=GRANULARITY_CHOICES)
+    bucket_start = models.DateTimeField()
+    uploads = models.PositiveIntegerField(default=0)
+    rows = models.BigIntegerField(default=0)
+    # Non-null values, their sum, min and max per parameter
+    flowrate_count = models.BigIntegerField(default=0)
+    flowrate_sum = models.FloatField(default=0.0)
+    flowrate_min = models.FloatField(null=True, blank=True)
+    flowrate_max = models.FloatField(null=True, blank=True)
+    pressure_count = models.BigIntegerField(default=0)
+    pressure_sum = models.FloatField(default=0.0)
+    pressure_min = models.FloatField(null=True, blank=True)
+    pressure_max = models.FloatField(null=True, blank=True)
+    temperature_count = models.BigIntegerField(default=0)
+    temperature_sum = models.FloatField(default=0.0)
+    temperature_min = models.FloatField(null=True, blank=True)
+    temperature_max = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['granularity', 'bucket_start'], name='unique_trend_bucket'),
+        ]
+
+
+class EquipmentRecord(models.Model):
+    """One row of an uploaded dataset, kept for drill-down queries."""
+
+    # (summary, type) below serves lookups by summary, so the FK needs no index of its own
+    summary = models.ForeignKey(
+        EquipmentSummary, related_name='records', on_delete=models.CASCADE, db_index=False,
+    )
+    equipment_name = models.CharField(max_length=255, null=True, blank=True)
+    type = models.CharField(max_length=100, null=True, blank=True)
+    flowrate = models.FloatField(null=True, blank=True)
+    pressure = models.FloatField(null=True, blank=True)
+    temperature = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['summary', 'type']),
+        ]
+
+
+class UploadJob(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    file = models.FileField(upload_to='uploads/jobs/')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    force = models.BooleanField(default=False)
+    append_to = models.ForeignKey(
+        EquipmentSummary, null=True, blank=True, related_name='+', on_delete=models.CASCADE,
+    )
+    error = models.TextField(blank=True)
+    validation = models.JSONField(null=True, blank=True)
+    summary = models.ForeignKey(EquipmentSummary, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class UploadSession(models.Model):
+    """A resumable upload whose bytes are appended to a part file under MEDIA_ROOT."""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField(null=True, blank=True)
+    offset = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def part_path(self):
+        return Path(settings.MEDIA_ROOT) / 'uploads' / 'partial' / f'{self.id}.part'
@@ -0,0 +1,199 @@
+"""
+Outlier flags for uploaded rows.
+
+Thresholds come from the finished statistics of an upload: mean +/- z * std
+for the z-score test and [Q1 - f * IQR, Q3 + f * IQR] for the IQR test, with
+quartiles read from the KLL sketches. Both tests are interval checks, so a
+second pass over the file flags whole chunks with NumPy comparisons, either
+against the upload's thresholds or, with ``by_type``, against those of each
+row's type. Only flagged rows are stored, with one bit per (parameter, test).
+
+The scan runs after the upload's summary has committed, so the thresholds
+are those of the stored statistics. Flagged rows are written in bounded
+batches, each its own short write, as row storage does. The same read counts
+the summary's fixed-width histogram bins exactly.
+"""
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .cache import invalidate_on_commit
+from .ingest import PARAMETERS, FixedHistogramCounter, iter_numeric_chunks
+from .models import EquipmentSummary, OutlierRow
+from .records import RECORD_FIELDS, get_batch_size, insert_rows
+from .writequeue import run_write
+
+ZSCORE = 'zscore'
+IQR = 'iqr'
+METHODS = [ZSCORE, IQR]
+
+DEFAULT_RULES = {
+    'enabled': True,
+    'methods': METHODS,
+    'z_threshold': 3.0,
+    'iqr_factor': 1.5,
+    # Compare rows with the statistics of their own Type instead of the upload's
+    'by_type': False,
+}
+
+OUTLIER_FIELDS = {"row": "row", **RECORD_FIELDS, "flags": "flags"}
+
+
+def get_rules():
+    return {**DEFAULT_RULES, **getattr(settings, 'ANALYTICS_OUTLIERS', {})}
+
+
+def flag_bit(name, method):
+    """Bit for a (parameter, test) pair in OutlierRow.flags."""
+    return 1 << (list(PARAMETERS).index(name) * len(METHODS) + METHODS.index(method))
+
+
+def describe_flags(flags):
+    return [
+        f"{name}:{method}"
+        for name in PARAMETERS for method in METHODS
+        if flags & flag_bit(name, method)
+    ]
+
+
+def _bounds(moments, sketch, method, rules):
+    """(low, high) for one parameter and test, or None if it cannot be computed."""
+    if method == ZSCORE:
+        count, total, m2 = moments[:3]
+        if count < 2:
+            return None
+        mean = total / count
+        spread = rules['z_threshold'] * (m2 / (count - 1)) ** 0.5
+        return mean - spread, mean + spread
+    if sketch is None or not sketch.n:
+        return None
+    q1, q3 = sketch.quantiles([0.25, 0.75])
+    spread = rules['iqr_factor'] * (q3 - q1)
+    return q1 - spread, q3 + spread
+
+
+def get_thresholds(accumulator, rules=None):
+    """
+    {(parameter, method): (low, high)} from the upload's statistics. With
+    ``by_type`` each bound is a dict of type -> value instead of a number.
+    """
+    rules = rules or get_rules()
+    thresholds = {}
+    for name in PARAMETERS:
+        for method in rules['methods']:
+            if not rules['by_type']:
+                bounds = _bounds(accumulator.moments[name], accumulator.sketches.get(name), method, rules)
+                if bounds is not None:
+                    thresholds[name, method] = bounds
+                continue
+            lows, highs = {}, {}
+            for type_name, moments in accumulator.type_moments.items():
+                sketch = accumulator.type_sketches.get(type_name, {}).get(name)
+                bounds = _bounds(moments[name], sketch, method, rules)
+                if bounds is not None:
+                    lows[type_name], highs[type_name] = bounds
+            if lows:
+                thresholds[name, method] = (lows, highs)
+    return thresholds
+
+
+def _flags(chunk, thresholds):
+    flags = np.zeros(len(chunk), dtype='int64')
+    types = chunk["Type"].astype(object)
+    for (name, method), (low, high) in thresholds.items():
+        values = chunk[PARAMETERS[name]].to_numpy(dtype='float64')
+        if isinstance(low, dict):
+            # Rows of types without statistics get NaN bounds and are never flagged
+            low = types.map(low).to_numpy(dtype='float64')
+            high = types.map(high).to_numpy(dtype='float64')
+        with np.errstate(invalid='ignore'):
+            outside = (values < low) | (values > high)
+        flags[outside] |= flag_bit(name, method)
+    return flags
+
+
+def iter_flagged(file, thresholds, offset=0, on_chunk=None):
+    """
+    Yield the flagged rows of each chunk of ``file`` as a frame, numbered
+    after ``offset`` (from 1) and with their flags. ``on_chunk`` is called
+    with every chunk read.
+    """
+    position = offset
+    for chunk in iter_numeric_chunks(file):
+        if on_chunk is not None:
+            on_chunk(chunk)
+        flags = _flags(chunk, thresholds)
+        flagged = np.flatnonzero(flags)
+        if flagged.size:
+            rows = chunk.iloc[flagged].copy()
+            rows["row"] = flagged + position + 1
+            rows["flags"] = flags[flagged]
+            yield rows
+        position += len(chunk)
+
+
+def _batched(frames, size):
+    """Concatenate consecutive frames into batches of at least ``size`` rows (the last may be smaller)."""
+    pending, held = [], 0
+    for frame in frames:
+        pending.append(frame)
+        held += len(frame)
+        if held >= size:
+            yield pd.concat(pending, ignore_index=True)
+            pending, held = [], 0
+    if pending:
+        yield pd.concat(pending, ignore_index=True)
+
+
+def _insert_outliers(summary_id, rows):
+    with transaction.atomic():
+        # Retention may have trimmed the summary since the scan started
+        if not EquipmentSummary.objects.filter(pk=summary_id).exists():
+            return False
+        insert_rows(OutlierRow, summary_id, rows, OUTLIER_FIELDS)
+    return True
+
+
+def _mark_loaded(summary_id, count, histograms=None, rows=None):
+    with transaction.atomic():
+        EquipmentSummary.objects.filter(pk=summary_id).update(
+            outlier_count=F('outlier_count') + count, outliers_loaded=True,
+        )
+        if histograms is not None:
+            # Counted over ``rows`` rows; an append since then has newer bins
+            EquipmentSummary.objects.filter(pk=summary_id, total_equipment=rows).update(histograms=histograms)
+        invalidate_on_commit()
+
+
+def load_outliers(summary, file, accumulator, offset=0):
+    """
+    Scan ``file`` for rows outside the thresholds from ``accumulator``'s
+    statistics and store them for a committed summary, numbered after
+    ``offset`` existing rows; then add them to ``outlier_count`` and set
+    ``outliers_loaded``. When the file is the whole dataset (no ``offset``),
+    the summary's fixed-width histogram counts are replaced with exact ones
+    counted on the way. Flagged rows are written in batches of about
+    ANALYTICS_RECORD_BATCH_SIZE, each its own write through the write queue,
+    so neither memory nor a transaction grows with the file. Returns False if
+    the summary was deleted before the scan finished.
+    """
+    rules = get_rules()
+    thresholds = get_thresholds(accumulator, rules) if rules['enabled'] else {}
+    counter = FixedHistogramCounter(summary.histograms) if summary.histograms and not offset else None
+    stored = 0
+    if thresholds or counter is not None:
+        on_chunk = counter.update if counter is not None else None
+        flagged = iter_flagged(file, thresholds, offset, on_chunk=on_chunk)
+        for batch in _batched(flagged, get_batch_size()):
+            if not run_write(_insert_outliers, summary.pk, batch):
+                return False
+            stored += len(batch)
+    histograms = counter.histograms if counter is not None else None
+    run_write(_mark_loaded, summary.pk, stored, histograms, accumulator.rows)
+    summary.outlier_count += stored
+    summary.outliers_loaded = True
+    if histograms is not None:
+        summary.histograms = histograms
+    return True
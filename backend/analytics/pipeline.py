@@ -0,0 +1,145 @@
+"""
+Upload pipeline shared by the synchronous endpoint and the background workers.
+"""
+import hashlib
+
+from django.db import transaction
+from django.utils import timezone
+
+from .aggregates import update_fleet
+from .cache import invalidate_on_commit
+from .ingest import IngestError, SummaryAccumulator, accumulate
+from .models import EquipmentSummary
+from .outliers import load_outliers
+from .records import load_records, records_enabled
+from .retention import trim_history
+from .trends import record_upload
+from .typestats import store_type_stats
+from .writequeue import queue_summary, run_write
+from .validation import Validator
+
+HASH_BUFFER_SIZE = 1024 * 1024
+
+
+def file_digest(file):
+    """Streaming SHA-256 of an upload's raw bytes; rewinds the file afterwards."""
+    digest = hashlib.sha256()
+    for data in iter(lambda: file.read(HASH_BUFFER_SIZE), b''):
+        digest.update(data)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def find_duplicate(digest):
+    """Return the stored summary for content with this hash, if any."""
+    return (
+        EquipmentSummary.objects.filter(content_sha256=digest)
+        .order_by('-uploaded_at')
+        .first()
+    )
+
+
+def store_summaries(summaries):
+    """
+    Save several computed summaries in one transaction and apply retention once.
+    Returns the saved rows in the same order; their outliers and rows are
+    loaded after the commit.
+    """
+    with transaction.atomic():
+        records = EquipmentSummary.objects.bulk_create(
+            [EquipmentSummary(**summary) for summary in summaries]
+        )
+        store_type_stats(records)
+        accumulators = [SummaryAccumulator.from_state(summary["stats"]) for summary in summaries]
+        update_fleet(accumulators, exclude=[record.pk for record in records])
+        for record, accumulator in zip(records, accumulators):
+            record_upload(record.uploaded_at, accumulator)
+        trim_history()
+        invalidate_on_commit()
+    return records
+
+
+def store_summary(summary):
+    """Save a computed summary through the write queue and apply the retention tiers."""
+    return queue_summary(summary)
+
+
+def process_upload(file, digest=None, force=False):
+    """
+    Parse an upload and store its summary, unless identical content was
+    already summarised (pass ``force`` to recompute anyway).
+
+    Returns ``(summary row, created)``.
+    """
+    digest = digest or file_digest(file)
+    if not force:
+        existing = find_duplicate(digest)
+        if existing is not None:
+            return existing, False
+
+    # Parsed here; only the short write goes through the queue, coalesced with
+    # any other uploads finishing at the same time. Outliers and rows follow
+    # in batches of their own.
+    accumulator = accumulate(file, validator=Validator())
+    record = store_summary({**accumulator.fields(), "content_sha256": digest})
+    load_outliers(record, file, accumulator)
+    if records_enabled():
+        load_records(record, file)
+    return record, True
+
+
+def apply_accumulator(record, accumulator):
+    """Set a summary row's aggregates and stored statistics from an accumulator."""
+    for field, value in accumulator.fields().items():
+        setattr(record, field, value)
+
+
+def append_upload(file, summary_id):
+    """
+    Add the rows in ``file`` to an existing dataset. Only the new rows are
+    parsed; their statistics are merged into the stored ones, so the result
+    matches a full recompute over the combined data.
+
+    Returns the updated summary row.
+    """
+    record = EquipmentSummary.objects.get(pk=summary_id)
+    _check_appendable(record)
+    accumulator = accumulate(file, validator=Validator())
+    updated, offset = run_write(_append, summary_id, accumulator)
+    # New rows are judged against the combined statistics; earlier flags stay as they were
+    load_outliers(updated, file, SummaryAccumulator.from_state(updated.stats), offset=offset)
+    if records_enabled():
+        load_records(updated, file)
+    return updated
+
+
+def _check_appendable(record):
+    if not record.stats:
+        raise IngestError(
+            "This summary predates stored statistics; upload the full dataset instead."
+        )
+
+
+def _append(summary_id, accumulator):
+    """
+    The write half of append_upload. Returns the updated row and the number
+    of rows it had before.
+    """
+    with transaction.atomic():
+        record = EquipmentSummary.objects.select_for_update().get(pk=summary_id)
+        _check_appendable(record)
+        offset = record.total_equipment
+        # Runs before the save so a first-time fleet seed sees the old state
+        update_fleet([accumulator], uploads=0)
+        # The new rows count towards the buckets they arrived in
+        record_upload(timezone.now(), accumulator, uploads=0)
+        apply_accumulator(record, SummaryAccumulator.from_state(record.stats).merge(accumulator))
+        # The hash described the original upload, not the combined dataset
+        record.content_sha256 = ''
+        # The appended rows and their outliers are loaded after commit
+        record.outliers_loaded = False
+        record.records_loaded = False
+        record.save()
+        store_type_stats([record])
+        invalidate_on_commit()
+    return record, offset
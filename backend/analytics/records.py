@@ -0,0 +1,102 @@
+"""
+Row-level storage of uploaded equipment data.
+
+Rows are inserted with a single prepared INSERT per batch via executemany,
+straight from the parsed chunk columns, instead of building a model instance
+per row. Uploads store their summary first; the rows follow afterwards, one
+short write transaction per batch, so a large file never holds the database
+write lock for the whole load.
+"""
+from itertools import repeat
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .cache import invalidate_on_commit
+from .ingest import NAME_COLUMN, PARAMETERS, iter_numeric_chunks
+from .models import EquipmentRecord, EquipmentSummary
+from .writequeue import run_write
+
+DEFAULT_BATCH_SIZE = 10_000
+
+# EquipmentRecord field -> upload column
+RECORD_FIELDS = {
+    "equipment_name": NAME_COLUMN,
+    "type": "Type",
+    **PARAMETERS,
+}
+
+
+def records_enabled():
+    return getattr(settings, 'ANALYTICS_STORE_RECORDS', False)
+
+
+def get_batch_size():
+    return getattr(settings, 'ANALYTICS_RECORD_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+
+
+def _column_values(series):
+    # Missing values (NaN/None) become NULL
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def insert_rows(model, summary_id, frame, fields):
+    """
+    Insert every row of ``frame`` into ``model``'s table with executemany.
+    ``fields`` maps column names to frame columns; summary_id is added.
+    """
+    quote = connection.ops.quote_name
+    names = ['summary_id', *fields]
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(model._meta.db_table),
+        ', '.join(quote(name) for name in names),
+        ', '.join(['%s'] * len(names)),
+    )
+    batch_size = get_batch_size()
+    with connection.cursor() as cursor:
+        for start in range(0, len(frame), batch_size):
+            batch = frame.iloc[start:start + batch_size]
+            columns = [
+                # Optional columns the upload lacks are stored as NULL
+                _column_values(batch[column]) if column in batch else repeat(None)
+                for column in fields.values()
+            ]
+            cursor.executemany(sql, zip(repeat(summary_id), *columns))
+
+
+def insert_records(summary_id, chunk):
+    """Insert every row of a parsed chunk as an EquipmentRecord of ``summary_id``."""
+    insert_rows(EquipmentRecord, summary_id, chunk, RECORD_FIELDS)
+
+
+def _insert_batch(summary_id, rows):
+    with transaction.atomic():
+        # Retention may have trimmed the summary since the load started
+        if not EquipmentSummary.objects.filter(pk=summary_id).exists():
+            return False
+        insert_records(summary_id, rows)
+    return True
+
+
+def _mark_loaded(summary_id):
+    with transaction.atomic():
+        EquipmentSummary.objects.filter(pk=summary_id).update(records_loaded=True)
+        invalidate_on_commit()
+
+
+def load_records(summary, file):
+    """
+    Parse ``file`` and store its rows for a committed summary, then set
+    ``records_loaded``. Parsing runs on the calling thread; each batch of
+    ANALYTICS_RECORD_BATCH_SIZE rows is its own write through the write queue.
+    Malformed numbers that validation allowed are stored as NULL. Returns
+    False if the summary was deleted before the load finished.
+    """
+    batch_size = get_batch_size()
+    for chunk in iter_numeric_chunks(file):
+        for start in range(0, len(chunk), batch_size):
+            if not run_write(_insert_batch, summary.pk, chunk.iloc[start:start + batch_size]):
+                return False
+    run_write(_mark_loaded, summary.pk)
+    summary.records_loaded = True
+    return True
@@ -0,0 +1,72 @@
+"""
+Resumable upload protocol.
+
+A client creates an UploadSession, PUTs consecutive byte ranges with a
+Content-Range header, can ask for the current offset at any time (e.g. after
+a dropped connection) and finally completes the session. Request bodies are
+copied to the part file in small pieces and never held in memory.
+"""
+import os
+import re
+
+from django.conf import settings
+
+from .writequeue import run_write
+
+COPY_BUFFER_SIZE = 64 * 1024
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
+
+
+class RangeError(ValueError):
+    """The byte range in a chunk request does not fit the session."""
+
+
+def parse_content_range(header):
+    """Parse 'bytes start-end/total' into (start, length, total or None)."""
+    match = CONTENT_RANGE_RE.match(header or '')
+    if not match:
+        raise RangeError("Content-Range header must look like 'bytes <start>-<end>/<total|*>'.")
+    start, end, total = match.groups()
+    start, end = int(start), int(end)
+    if end < start:
+        raise RangeError("Content-Range end is before start.")
+    return start, end - start + 1, None if total == '*' else int(total)
+
+
+def write_range(session, stream, start, length):
+    """
+    Copy up to ``length`` bytes from ``stream`` into the session's part file at
+    ``start`` and advance the session offset by the bytes actually received, so
+    a truncated request can be resumed from where it stopped.
+    """
+    if start != session.offset:
+        raise RangeError(f"Expected a chunk starting at byte {session.offset}.")
+    if session.size is not None and start + length > session.size:
+        raise RangeError("Chunk extends past the declared upload size.")
+
+    path = session.part_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    received = 0
+    with open(path, 'r+b' if path.exists() else 'wb') as part:
+        part.seek(start)
+        part.truncate()
+        while received < length:
+            data = stream.read(min(COPY_BUFFER_SIZE, length - received))
+            if not data:
+                break
+            part.write(data)
+            received += len(data)
+
+    session.offset = start + received
+    run_write(session.save, update_fields=['offset', 'updated_at'])
+    return received
+
+
+def move_to_media(session, upload_to):
+    """Move a finished part file under MEDIA_ROOT/upload_to and return its storage name."""
+    name = os.path.join(upload_to, f'{session.id}_{session.filename}')
+    target = os.path.join(settings.MEDIA_ROOT, name)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(session.part_path, target)
+    return name
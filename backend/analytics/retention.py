@@ -0,0 +1,140 @@
+"""
+Tiered retention of upload history.
+
+The newest ``detail`` summaries are kept as they are, rows and all. Older
+summaries are folded into hourly rollups (merged SummaryAccumulator state plus
+an upload count) and deleted. Hourly rollups older than ``hourly_days`` are
+folded into daily ones, and daily rollups older than ``daily_days`` are
+written to ``MEDIA_ROOT/archive`` as one JSON file per day and removed.
+Buckets come from timebuckets.bucket_start, as the trend rollups' do.
+
+Each step only touches the rows that just crossed a boundary, so the cost of
+an upload does not grow with the length of the history.
+"""
+import json
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .ingest import SummaryAccumulator
+from .models import EquipmentSummary, SummaryRollup
+from .timebuckets import bucket_start
+
+DEFAULT_RULES = {
+    "detail": 5,
+    "hourly_days": 7,
+    "daily_days": 365,
+    "archive": True,
+}
+
+
+def get_rules():
+    return {**DEFAULT_RULES, **getattr(settings, 'ANALYTICS_RETENTION', {})}
+
+
+def fold(granularity, start, accumulator, uploads):
+    """Merge ``accumulator`` into the rollup for one bucket, creating it if needed."""
+    rollup, created = SummaryRollup.objects.select_for_update().get_or_create(
+        granularity=granularity, bucket_start=start,
+        defaults={"uploads": uploads, "stats": accumulator.to_state()},
+    )
+    if not created:
+        rollup.stats = SummaryAccumulator.from_state(rollup.stats).merge(accumulator).to_state()
+        rollup.uploads += uploads
+        rollup.save(update_fields=['stats', 'uploads', 'updated_at'])
+    return rollup
+
+
+def _merge_into_buckets(items, granularity):
+    """
+    Group ``(moment, accumulator, uploads)`` items by bucket and fold each
+    group into its rollup with one read and one write.
+    """
+    buckets = {}
+    for moment, accumulator, uploads in items:
+        start = bucket_start(moment, granularity)
+        if start in buckets:
+            merged, count = buckets[start]
+            buckets[start] = (merged.merge(accumulator), count + uploads)
+        else:
+            buckets[start] = (accumulator, uploads)
+    for start, (accumulator, uploads) in buckets.items():
+        fold(granularity, start, accumulator, uploads)
+
+
+def evicted_summaries(keep):
+    """Summaries older than the newest ``keep``, found from the uploaded_at index."""
+    if keep <= 0:
+        return EquipmentSummary.objects.all()
+    boundary = (
+        EquipmentSummary.objects.order_by('-uploaded_at', '-pk')
+        .values('uploaded_at', 'pk')[keep - 1:keep]
+        .first()
+    )
+    if boundary is None:
+        return EquipmentSummary.objects.none()
+    return EquipmentSummary.objects.filter(
+        Q(uploaded_at__lt=boundary['uploaded_at'])
+        | Q(uploaded_at=boundary['uploaded_at'], pk__lt=boundary['pk'])
+    )
+
+
+def archive_path(start):
+    # Named after the local day the bucket covers
+    return os.path.join(settings.MEDIA_ROOT, 'archive', f'{timezone.localtime(start):%Y-%m-%d}.json')
+
+
+def archive(rollup):
+    """Write a daily rollup to its archive file (overwritten if it exists)."""
+    path = archive_path(rollup.bucket_start)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as file:
+        json.dump({
+            "day": rollup.bucket_start.isoformat(),
+            "uploads": rollup.uploads,
+            "stats": rollup.stats,
+        }, file)
+
+
+def trim_history(rules=None):
+    """
+    Apply the retention tiers. Must run inside the upload's transaction.
+    Returns the number of summaries rolled up.
+    """
+    rules = rules or get_rules()
+    now = timezone.now()
+
+    evicted = evicted_summaries(rules["detail"])
+    items = [
+        (summary.uploaded_at, SummaryAccumulator.from_summary(summary), 1)
+        for summary in evicted.order_by('uploaded_at')
+    ]
+    if items:
+        _merge_into_buckets(items, SummaryRollup.HOUR)
+        # One set-based delete; rows and outliers go with it through the FK cascade
+        evicted.delete()
+
+    hourly = SummaryRollup.objects.filter(
+        granularity=SummaryRollup.HOUR,
+        bucket_start__lt=now - timedelta(days=rules["hourly_days"]),
+    )
+    stale = [
+        (rollup.bucket_start, SummaryAccumulator.from_state(rollup.stats), rollup.uploads)
+        for rollup in hourly
+    ]
+    if stale:
+        _merge_into_buckets(stale, SummaryRollup.DAY)
+        hourly.delete()
+
+    daily = SummaryRollup.objects.filter(
+        granularity=SummaryRollup.DAY,
+        bucket_start__lt=now - timedelta(days=rules["daily_days"]),
+    )
+    if rules["archive"]:
+        for rollup in daily:
+            archive(rollup)
+    daily.delete()
+    return len(items)
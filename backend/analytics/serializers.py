@@ -1,4 +1,151 @@
+from django.core.exceptions import SuspiciousFileOperation
+from django.utils.text import get_valid_filename
 from rest_framework import serializers
+from .ingest import PARAMETERS
+from .models import EquipmentRecord, EquipmentSummary, OutlierRow, UploadJob, UploadSession
+from .outliers import METHODS, describe_flags
+from .trends import GRANULARITIES
+from .typestats import TRUNCATE
+from .sketches import DEFAULT_QUANTILES, HISTOGRAM_KINDS
+
+PROCESSING_MODES = ['sync', 'async']
 
 class CSVUploadSerializer(serializers.Serializer):
     file = serializers.FileField()
+    mode = serializers.ChoiceField(choices=PROCESSING_MODES, default='sync')
+    force = serializers.BooleanField(default=False)
+    # Add the file's rows to this existing dataset instead of creating a new one
+    append_to = serializers.PrimaryKeyRelatedField(
+        queryset=EquipmentSummary.objects.all(), required=False, allow_null=True,
+    )
+
+
+class BatchUploadSerializer(serializers.Serializer):
+    files = serializers.ListField(child=serializers.FileField(), allow_empty=False)
+    force = serializers.BooleanField(default=False)
+
+
+class UploadCompleteSerializer(serializers.Serializer):
+    mode = serializers.ChoiceField(choices=PROCESSING_MODES, default='sync')
+    force = serializers.BooleanField(default=False)
+
+
+class QuantileQuerySerializer(serializers.Serializer):
+    # Summaries to merge; all stored summaries when omitted
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    q = serializers.ListField(
+        child=serializers.FloatField(min_value=0, max_value=1), default=DEFAULT_QUANTILES,
+    )
+    parameter = serializers.ChoiceField(choices=list(PARAMETERS), required=False)
+
+
+class AggregateQuerySerializer(serializers.Serializer):
+    # With none of these the running fleet-wide aggregate is returned
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+
+
+class TypeQuerySerializer(serializers.Serializer):
+    type = serializers.CharField(required=False)
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+
+
+class TypeTrendQuerySerializer(TypeQuerySerializer):
+    bucket = serializers.ChoiceField(choices=list(TRUNCATE), default='day')
+
+
+class TrendQuerySerializer(serializers.Serializer):
+    bucket = serializers.ChoiceField(choices=GRANULARITIES, default='day')
+    param = serializers.ChoiceField(choices=list(PARAMETERS), required=False)
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+
+
+class HistogramQuerySerializer(serializers.Serializer):
+    parameter = serializers.ChoiceField(choices=list(PARAMETERS), required=False)
+    kind = serializers.ChoiceField(choices=HISTOGRAM_KINDS, required=False)
+    type = serializers.CharField(required=False)
+
+
+class EquipmentSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = EquipmentSummary
+        fields = [
+            'id',
+            'total_equipment',
+            'avg_flowrate',
+            'avg_pressure',
+            'avg_temperature',
+            'type_distribution',
+            'distinct_equipment',
+            'distinct_types',
+            'parameter_stats',
+            'type_stats',
+            'correlations',
+            'outlier_count',
+            'outliers_loaded',
+            'records_loaded',
+            'uploaded_at',
+        ]
+
+
+class EquipmentRecordSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = EquipmentRecord
+        fields = ['id', 'equipment_name', 'type', 'flowrate', 'pressure', 'temperature']
+
+
+class RecordQuerySerializer(serializers.Serializer):
+    type = serializers.CharField(required=False)
+    # Inclusive bounds on each parameter
+    flowrate_min = serializers.FloatField(required=False)
+    flowrate_max = serializers.FloatField(required=False)
+    pressure_min = serializers.FloatField(required=False)
+    pressure_max = serializers.FloatField(required=False)
+    temperature_min = serializers.FloatField(required=False)
+    temperature_max = serializers.FloatField(required=False)
+
+
+class OutlierQuerySerializer(serializers.Serializer):
+    parameter = serializers.ChoiceField(choices=list(PARAMETERS), required=False)
+    method = serializers.ChoiceField(choices=METHODS, required=False)
+    type = serializers.CharField(required=False)
+
+
+class OutlierRowSerializer(serializers.ModelSerializer):
+    flags = serializers.SerializerMethodField()
+
+    class Meta:
+        model = OutlierRow
+        fields = ['id', 'row', 'equipment_name', 'type', 'flowrate', 'pressure', 'temperature', 'flags']
+
+    def get_flags(self, obj):
+        return describe_flags(obj.flags)
+
+
+class UploadJobSerializer(serializers.ModelSerializer):
+    summary = EquipmentSummarySerializer(read_only=True)
+
+    class Meta:
+        model = UploadJob
+        fields = ['id', 'status', 'error', 'validation', 'summary', 'created_at', 'updated_at']
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'filename', 'size', 'offset', 'created_at', 'updated_at']
+        read_only_fields = ['offset']
+
+    def validate_filename(self, value):
+        try:
+            return get_valid_filename(value.replace('\\', '/').rsplit('/', 1)[-1])
+        except SuspiciousFileOperation:
+            raise serializers.ValidationError("Invalid file name.")
+
+    def validate_size(self, value):
+        if value is not None and value < 0:
+            raise serializers.ValidationError("Size cannot be negative.")
+        return value
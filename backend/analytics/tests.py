@@ -1,3 +1,1127 @@
-from django.test import TestCase
+import bz2
+import gzip
+import io
+import json
+import lzma
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+import zipfile
+from datetime import datetime, timedelta
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import batch, ingest, outliers, pipeline, retention, workers, writequeue
+from .ingest import COLUMNS, IngestError, PARAMETERS, SummaryAccumulator, accumulate, iter_chunks, iter_numeric_chunks
+from .models import EquipmentRecord, EquipmentSummary, OutlierRow, SummaryRollup, UploadJob, UploadSession
+from .records import load_records
+from .sketches import KLLSketch
+from .timebuckets import bucket_start
+from .trends import record_upload
+
+try:
+    import pyarrow as pa
+    from pyarrow import ipc as pa_ipc
+    from pyarrow import parquet as pq
+except ImportError:
+    pa = pa_ipc = pq = None
+
+TYPES = ['Pump', 'Valve', 'Compressor', 'Reactor', 'Heat Exchanger']
+
+# Parses a file in a fresh interpreter and prints its peak RSS in KiB
+PEAK_RSS_SCRIPT = """
+import resource, sys, django
+django.setup()
+from analytics.ingest import accumulate
+with open(sys.argv[1], 'rb') as file:
+    accumulate(file)
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def make_frame(rows, seed, start=0):
+    """Equipment rows with a few missing values, as uploads have."""
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({
+        "Equipment Name": [f'E{index}' for index in range(start, start + rows)],
+        "Type": rng.choice(TYPES, rows),
+        "Flowrate": rng.normal(100, 15, rows).round(3),
+        "Pressure": rng.normal(5, 1, rows).round(3),
+        "Temperature": rng.normal(100, 8, rows).round(2),
+    })
+    for column in PARAMETERS.values():
+        frame.loc[rng.random(rows) < 0.02, column] = np.nan
+    return frame
+
+
+def to_csv(frame, name='upload.csv'):
+    return SimpleUploadedFile(name, frame.to_csv(index=False).encode(), content_type='text/csv')
+
+
+@override_settings(
+    ANALYTICS_WRITE_QUEUE={'enabled': False},
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class AppendUploadTests(TestCase):
+    def test_append_matches_full_recompute(self):
+        base, delta = make_frame(500, seed=1), make_frame(200, seed=2, start=500)
+        client = APIClient()
+        first = client.post('/api/upload/', {'file': to_csv(base)}, format='multipart')
+        self.assertEqual(first.status_code, 200)
+        appended = client.post(
+            '/api/upload/', {'file': to_csv(delta, 'delta.csv'), 'append_to': first.json()['id']},
+            format='multipart',
+        )
+        self.assertEqual(appended.status_code, 200)
+        summary = appended.json()
+
+        combined = pd.concat([base, delta], ignore_index=True)
+        self.assertEqual(summary['id'], first.json()['id'])
+        self.assertEqual(summary['total_equipment'], len(combined))
+        self.assertEqual(summary['type_distribution'], combined['Type'].value_counts().to_dict())
+        for name, column in PARAMETERS.items():
+            values = combined[column]
+            stats = summary['parameter_stats'][name]
+            self.assertEqual(stats['count'], values.count())
+            self.assertAlmostEqual(summary[f'avg_{name}'], values.mean(), places=9)
+            self.assertAlmostEqual(stats['std'], values.std(), places=9)
+            self.assertEqual(stats['min'], values.min())
+            self.assertEqual(stats['max'], values.max())
+        for type_name, group in combined.groupby('Type'):
+            type_stats = summary['type_stats'][type_name]
+            self.assertEqual(type_stats['count'], len(group))
+            for name, column in PARAMETERS.items():
+                self.assertAlmostEqual(type_stats[name]['mean'], group[column].mean(), places=9)
+
+
+@override_settings(ANALYTICS_WRITE_QUEUE={'enabled': False})
+class ChunkedTotalsTests(TestCase):
+    def test_chunked_totals_match_read_csv(self):
+        data = make_frame(1000, seed=3).to_csv(index=False).encode()
+        expected = pd.read_csv(io.BytesIO(data))
+        for engine in ['c', 'pyarrow']:
+            with self.subTest(engine=engine), override_settings(ANALYTICS_CSV_ENGINE=engine):
+                # Small chunks so rows are split across many of them
+                accumulator = accumulate(io.BytesIO(data), chunk_size=37)
+                self.assertEqual(accumulator.rows, len(expected))
+                self.assertEqual(accumulator.types, expected['Type'].value_counts().to_dict())
+                for name, column in PARAMETERS.items():
+                    count, total, _, low, high = accumulator.moments[name]
+                    self.assertEqual(count, expected[column].count())
+                    self.assertAlmostEqual(total, expected[column].sum(), places=6)
+                    self.assertEqual(low, expected[column].min())
+                    self.assertEqual(high, expected[column].max())
+
+
+@unittest.skipIf(resource is None, "needs the resource module")
+class StreamingMemoryTests(TestCase):
+    def peak_rss(self, path):
+        output = subprocess.run(
+            [sys.executable, '-c', PEAK_RSS_SCRIPT, path],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout
+        return int(output.split()[-1]) * 1024
+
+    def test_peak_memory_does_not_grow_with_the_file(self):
+        body = make_frame(200_000, seed=7).to_csv(index=False, header=False)
+        with tempfile.TemporaryDirectory() as directory:
+            sizes = {}
+            for copies in (1, 8):
+                path = os.path.join(directory, f'{copies}.csv')
+                with open(path, 'w') as file:
+                    file.write(','.join(COLUMNS) + '\n')
+                    for _ in range(copies):
+                        file.write(body)
+                sizes[copies] = (os.path.getsize(path), self.peak_rss(path))
+
+        (small_file, small_peak), (large_file, large_peak) = sizes[1], sizes[8]
+        # The large file is ~60 MB bigger; allow a small fraction of that
+        self.assertLess(large_peak - small_peak, (large_file - small_file) / 4)
+
+
+class ParseTests(TestCase):
+    def test_only_aggregated_columns_are_parsed(self):
+        frame = make_frame(50, seed=6)
+        frame.insert(1, "Notes", 'free text, "quoted"')
+        frame["Serial"] = range(len(frame))
+        data = frame.to_csv(index=False).encode()
+        for engine in ['c', 'pyarrow']:
+            with self.subTest(engine=engine), override_settings(ANALYTICS_CSV_ENGINE=engine):
+                chunk = next(iter_chunks(io.BytesIO(data)))
+                self.assertEqual(list(chunk.columns), COLUMNS)
+                for column in PARAMETERS.values():
+                    self.assertEqual(chunk[column].dtype, 'float64')
+
+    def test_lenient_reread_resumes_after_yielded_rows(self):
+        lines = [f'E{index},Pump,{index},2,3' for index in range(10)] + ['E10,Pump,abc,2,3', 'E11,Pump,5,2,3']
+        data = '\n'.join([','.join(COLUMNS), *lines]).encode()
+        chunks = list(iter_numeric_chunks(io.BytesIO(data), chunk_size=4))
+        values = pd.concat(chunks)["Flowrate"]
+        self.assertEqual(values.dtype, 'float64')
+        self.assertEqual(values.isna().tolist(), [False] * 10 + [True, False])
+        self.assertEqual(values.dropna().tolist(), [*range(10), 5])
+
+    def test_unknown_engine_is_rejected(self):
+        data = make_frame(5, seed=6).to_csv(index=False).encode()
+        with override_settings(ANALYTICS_CSV_ENGINE='pandas'):
+            with self.assertRaises(ImproperlyConfigured):
+                accumulate(io.BytesIO(data))
+
+
+@unittest.skipIf(pa is None, "needs pyarrow")
+class ColumnarFormatTests(TestCase):
+    def columnar_files(self, frame):
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        parquet = io.BytesIO()
+        pq.write_table(table, parquet, row_group_size=len(frame))
+        arrow_file, arrow_stream = io.BytesIO(), io.BytesIO()
+        with pa_ipc.new_file(arrow_file, table.schema) as writer:
+            writer.write_table(table)
+        with pa_ipc.new_stream(arrow_stream, table.schema) as writer:
+            writer.write_table(table)
+        return {"parquet": parquet, "arrow file": arrow_file, "arrow stream": arrow_stream}
+
+    def test_columnar_uploads_match_csv(self):
+        frame = make_frame(1000, seed=9)
+        expected = accumulate(io.BytesIO(frame.to_csv(index=False).encode())).summary()
+        for name, file in self.columnar_files(frame).items():
+            with self.subTest(format=name):
+                summary = accumulate(file).summary()
+                self.assertEqual(summary['total_equipment'], expected['total_equipment'])
+                self.assertEqual(summary['type_distribution'], expected['type_distribution'])
+                for parameter in PARAMETERS:
+                    self.assertAlmostEqual(summary[f'avg_{parameter}'], expected[f'avg_{parameter}'], places=9)
+
+    def test_single_batch_is_split_into_chunks(self):
+        # Each file holds the whole table as one record batch or row group
+        for name, file in self.columnar_files(make_frame(1000, seed=9)).items():
+            with self.subTest(format=name):
+                sizes = [len(chunk) for chunk in iter_chunks(file, chunk_size=300)]
+                self.assertEqual(sizes, [300, 300, 300, 100])
+
+
+@override_settings(
+    ANALYTICS_WRITE_QUEUE={'enabled': False},
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class DistinctCountTests(TestCase):
+    def test_distinct_equipment_is_estimated(self):
+        frame = pd.concat([make_frame(3000, seed=8)] * 2, ignore_index=True)
+        summary = APIClient().post('/api/upload/', {'file': to_csv(frame)}, format='multipart').json()
+        self.assertAlmostEqual(summary['distinct_equipment'], 3000, delta=3000 * 0.04)
+        self.assertEqual(summary['distinct_types'], len(TYPES))
+
+    def test_names_are_optional(self):
+        frame = make_frame(100, seed=8).drop(columns=["Equipment Name"])
+        data = frame.to_csv(index=False).encode()
+        for engine in ['c', 'pyarrow']:
+            with self.subTest(engine=engine), override_settings(ANALYTICS_CSV_ENGINE=engine):
+                response = APIClient().post(
+                    '/api/upload/', {'file': SimpleUploadedFile('upload.csv', data), 'force': True},
+                    format='multipart',
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertIsNone(response.json()['distinct_equipment'])
+                self.assertEqual(response.json()['total_equipment'], 100)
+
+
+class SketchMergeTests(TestCase):
+    def test_merged_quantiles_within_rank_error(self):
+        rng = np.random.default_rng(4)
+        parts = [rng.normal(rng.uniform(0, 10), rng.uniform(1, 3), 5000) for _ in range(20)]
+        merged = KLLSketch()
+        merged.rng = np.random.default_rng(5)
+        for seed, values in enumerate(parts):
+            sketch = KLLSketch()
+            sketch.rng = np.random.default_rng(seed)
+            sketch.update(values)
+            # Through stored state, as the fleet and quantile endpoints merge them
+            merged.merge(KLLSketch.from_state(sketch.to_state()))
+
+        values = np.sort(np.concatenate(parts))
+        self.assertEqual(merged.n, len(values))
+        self.assertEqual((merged.min, merged.max), (values[0], values[-1]))
+        qs = [0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+        for q, estimate in zip(qs, merged.quantiles(qs)):
+            rank = np.searchsorted(values, estimate, side='right') / len(values)
+            self.assertLessEqual(abs(rank - q), merged.rank_error(), msg=f"q={q}")
+
+
+@override_settings(ANALYTICS_WRITE_QUEUE={'enabled': False})
+class WorkerRecoveryTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+
+    def make_job(self, status=UploadJob.QUEUED):
+        job = UploadJob(status=status)
+        job.file.save('upload.csv', ContentFile(b'data'), save=False)
+        job.save()
+        return job
+
+    def test_broken_pool_is_replaced(self):
+        self.addCleanup(lambda: workers.discard_executor(workers.get_executor()))
+        # A worker exiting mid-task breaks the pool, as an OOM kill would
+        with self.assertRaises(BrokenProcessPool):
+            workers.get_executor().submit(os._exit, 1).result(timeout=60)
+        with self.assertLogs('analytics.workers', 'WARNING'):
+            self.assertEqual(workers.submit(pow, 2, 3).result(timeout=60), 8)
+
+    def test_job_is_failed_when_it_cannot_be_submitted(self):
+        job = self.make_job()
+        path = job.file.path
+        with mock.patch.object(workers, 'submit', side_effect=RuntimeError("pool is gone")), \
+                self.assertLogs('analytics.workers', 'ERROR'):
+            workers.submit_upload_job(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, UploadJob.FAILED)
+        self.assertIn("pool is gone", job.error)
+        self.assertFalse(os.path.exists(path))
+
+    def test_job_is_failed_when_its_worker_dies(self):
+        job = self.make_job(UploadJob.RUNNING)
+        future = Future()
+        future.set_exception(BrokenProcessPool("terminated abruptly"))
+        with self.assertLogs('analytics.workers', 'ERROR'):
+            workers._job_finished(job.pk, future)
+        job.refresh_from_db()
+        self.assertEqual(job.status, UploadJob.FAILED)
+        self.assertIn("terminated abruptly", job.error)
+
+    def test_finished_job_is_left_alone(self):
+        job = self.make_job(UploadJob.DONE)
+        future = Future()
+        future.set_result(None)
+        workers._job_finished(job.pk, future)
+        job.refresh_from_db()
+        self.assertEqual(job.status, UploadJob.DONE)
+
+    def test_restart_fails_running_and_resubmits_queued_jobs(self):
+        running, queued = self.make_job(UploadJob.RUNNING), self.make_job()
+        with mock.patch.object(workers, 'submit_upload_job') as submit_upload_job:
+            workers.recover_jobs()
+        running.refresh_from_db()
+        self.assertEqual(running.status, UploadJob.FAILED)
+        self.assertEqual(running.error, "Interrupted by a server restart.")
+        self.assertEqual([call.args[0].pk for call in submit_upload_job.call_args_list], [queued.pk])
+
+
+@override_settings(
+    ANALYTICS_WRITE_QUEUE={'enabled': False},
+    ANALYTICS_CSV_CHUNK_SIZE=100,
+    ANALYTICS_RECORD_BATCH_SIZE=20,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class OutlierStorageTests(TestCase):
+    def test_outliers_are_stored_in_bounded_batches(self):
+        frame = make_frame(2000, seed=10)
+        frame.loc[::50, "Pressure"] = 50.0
+        with mock.patch.object(outliers, '_insert_outliers', wraps=outliers._insert_outliers) as insert:
+            response = APIClient().post('/api/upload/', {'file': to_csv(frame)}, format='multipart')
+        summary = response.json()
+        self.assertTrue(summary['outliers_loaded'])
+
+        stored = EquipmentSummary.objects.get(pk=summary['id'])
+        thresholds = outliers.get_thresholds(SummaryAccumulator.from_state(stored.stats))
+        flags = outliers._flags(frame, thresholds)
+        expected = (np.flatnonzero(flags) + 1).tolist()
+        rows = list(OutlierRow.objects.filter(summary=stored).order_by('row').values_list('row', 'flags'))
+        self.assertEqual([row for row, _ in rows], expected)
+        self.assertEqual([flag for _, flag in rows], flags[flags > 0].tolist())
+        self.assertEqual(summary['outlier_count'], len(expected))
+        # Each write holds less than a batch plus one chunk, however many rows are flagged
+        sizes = [len(call.args[1]) for call in insert.call_args_list]
+        self.assertEqual(sum(sizes), len(expected))
+        self.assertLess(max(sizes), 20 + 100)
+        self.assertGreater(len(sizes), 1)
+
+
+@override_settings(
+    ANALYTICS_WRITE_QUEUE={'enabled': False},
+    ANALYTICS_STORE_RECORDS=True,
+    ANALYTICS_RECORD_BATCH_SIZE=50,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class RecordStorageTests(TestCase):
+    def test_rows_are_stored_and_filtered(self):
+        frame = make_frame(300, seed=11)
+        client = APIClient()
+        summary = client.post('/api/upload/', {'file': to_csv(frame)}, format='multipart').json()
+        self.assertTrue(summary['records_loaded'])
+        self.assertEqual(EquipmentRecord.objects.filter(summary=summary['id']).count(), len(frame))
+
+        response = client.get(
+            f"/api/summaries/{summary['id']}/records/",
+            {'type': 'Pump', 'flowrate_min': 100, 'pressure_max': 5, 'page_size': 1000},
+        )
+        self.assertEqual(response.status_code, 200)
+        expected = frame[(frame["Type"] == 'Pump') & (frame["Flowrate"] >= 100) & (frame["Pressure"] <= 5)]
+        self.assertEqual(
+            [row['equipment_name'] for row in response.json()['results']],
+            expected["Equipment Name"].tolist(),
+        )
+        invalid = client.get(f"/api/summaries/{summary['id']}/records/", {'flowrate_min': 'high'})
+        self.assertEqual(invalid.status_code, 400)
+
+    def test_disabled_storage_is_a_conflict(self):
+        client = APIClient()
+        with override_settings(ANALYTICS_STORE_RECORDS=False):
+            summary = client.post('/api/upload/', {'file': to_csv(make_frame(20, seed=11))}, format='multipart').json()
+            response = client.get(f"/api/summaries/{summary['id']}/records/")
+        self.assertFalse(summary['records_loaded'])
+        self.assertEqual(response.status_code, 409)
+
+    def test_malformed_numbers_are_stored_as_null(self):
+        summary = EquipmentSummary.objects.create(
+            total_equipment=3, avg_flowrate=1, avg_pressure=1, avg_temperature=1, type_distribution={},
+        )
+        data = '\n'.join([','.join(COLUMNS), 'A,Pump,1,2,3', 'B,Pump,abc,2,3', 'C,Pump,4,5,6']).encode()
+        self.assertTrue(load_records(summary, io.BytesIO(data)))
+        rows = EquipmentRecord.objects.filter(summary=summary).order_by('id')
+        self.assertEqual(list(rows.values_list('flowrate', flat=True)), [1.0, None, 4.0])
+        self.assertTrue(EquipmentSummary.objects.get(pk=summary.pk).records_loaded)
+
+
+class WriteQueueTests(TestCase):
+    def setUp(self):
+        self.batches = []
+        patcher = mock.patch.object(writequeue, '_store_batch', side_effect=self.store_batch)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.queue = writequeue.WriteQueue(max_batch=2, max_delay=1.0)
+
+    def store_batch(self, summaries):
+        self.batches.append(list(summaries))
+        if 'bad' in summaries:
+            raise ValueError("bad summary")
+        return [f'row {summary}' for summary in summaries]
+
+    def store_together(self, *summaries):
+        """Queue ``summaries`` while the writer is busy, so they are collected together."""
+        release = threading.Event()
+        busy = threading.Thread(target=self.queue.run, args=(release.wait,))
+        busy.start()
+        results = {}
+
+        def store(summary):
+            try:
+                results[summary] = self.queue.store(summary)
+            except ValueError as exc:
+                results[summary] = exc
+
+        threads = [threading.Thread(target=store, args=(summary,)) for summary in summaries]
+        for thread in threads:
+            thread.start()
+        while self.queue.items.qsize() < len(summaries):
+            threading.Event().wait(0.01)
+        release.set()
+        for thread in [busy, *threads]:
+            thread.join(timeout=10)
+        return results
+
+    def test_queued_summaries_are_coalesced(self):
+        results = self.store_together('a', 'b')
+        self.assertEqual(results, {'a': 'row a', 'b': 'row b'})
+        self.assertEqual([sorted(batch) for batch in self.batches], [['a', 'b']])
+
+    def test_failing_summary_only_fails_its_own_upload(self):
+        with self.assertLogs('analytics.writequeue', 'WARNING'):
+            results = self.store_together('good', 'bad')
+        self.assertEqual(results['good'], 'row good')
+        self.assertIsInstance(results['bad'], ValueError)
+        # The coalesced attempt, then each summary on its own
+        self.assertEqual(len(self.batches), 3)
+
+    def test_nested_writes_run_inline_on_the_writer(self):
+        def outer():
+            return self.queue.run(lambda: threading.current_thread().name)
+
+        self.assertEqual(self.queue.run(outer), 'analytics-writer')
+        self.assertEqual(self.queue.run(self.queue.store, 'nested'), 'row nested')
+
+
+@override_settings(
+    ANALYTICS_WRITE_QUEUE={'enabled': False},
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class RetentionTests(TestCase):
+    rules = {"detail": 3, "hourly_days": 7, "daily_days": 365, "archive": True}
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+
+    def accumulator(self, rows, seed):
+        return accumulate(io.BytesIO(make_frame(rows, seed).to_csv(index=False).encode()))
+
+    def rollup(self, granularity, start, rows, uploads=1):
+        return SummaryRollup.objects.create(
+            granularity=granularity, bucket_start=start, uploads=uploads,
+            stats=self.accumulator(rows, seed=rows).to_state(),
+        )
+
+    def test_eviction_keeps_the_newest_detail_summaries(self):
+        uploaded_at = timezone.now() - timedelta(hours=2)
+        summaries = [
+            EquipmentSummary.objects.create(**self.accumulator(10 + index, seed=index).fields())
+            for index in range(5)
+        ]
+        # Equal timestamps are ordered by id
+        EquipmentSummary.objects.update(uploaded_at=uploaded_at)
+
+        self.assertEqual(retention.trim_history(self.rules), 2)
+        kept = EquipmentSummary.objects.order_by('pk').values_list('pk', flat=True)
+        self.assertEqual(list(kept), [summary.pk for summary in summaries[2:]])
+        rollup = SummaryRollup.objects.get()
+        self.assertEqual(rollup.granularity, SummaryRollup.HOUR)
+        self.assertEqual(rollup.bucket_start, bucket_start(uploaded_at, 'hour'))
+        self.assertEqual(rollup.uploads, 2)
+        self.assertEqual(rollup.stats['rows'], 10 + 11)
+        # Nothing further crosses the boundary until the next upload
+        self.assertEqual(retention.trim_history(self.rules), 0)
+
+    def test_old_hourly_rollups_fold_into_their_day(self):
+        day = bucket_start(timezone.now() - timedelta(days=10), 'day')
+        self.rollup(SummaryRollup.HOUR, day + timedelta(hours=1), 10, uploads=2)
+        self.rollup(SummaryRollup.HOUR, day + timedelta(hours=5), 20, uploads=3)
+        recent = self.rollup(SummaryRollup.HOUR, bucket_start(timezone.now(), 'hour'), 30)
+
+        retention.trim_history(self.rules)
+        daily = SummaryRollup.objects.get(granularity=SummaryRollup.DAY)
+        self.assertEqual((daily.bucket_start, daily.uploads, daily.stats['rows']), (day, 5, 30))
+        self.assertEqual(list(SummaryRollup.objects.filter(granularity=SummaryRollup.HOUR)), [recent])
+
+    def test_expired_daily_rollups_are_archived(self):
+        day = bucket_start(timezone.now() - timedelta(days=400), 'day')
+        rollup = self.rollup(SummaryRollup.DAY, day, 10, uploads=4)
+
+        retention.trim_history(self.rules)
+        self.assertFalse(SummaryRollup.objects.exists())
+        with open(retention.archive_path(day)) as file:
+            archived = json.load(file)
+        self.assertEqual(archived, {"day": day.isoformat(), "uploads": 4, "stats": rollup.stats})
+
+        self.rollup(SummaryRollup.DAY, day - timedelta(days=1), 10)
+        retention.trim_history({**self.rules, "archive": False})
+        self.assertFalse(SummaryRollup.objects.exists())
+        self.assertFalse(os.path.exists(retention.archive_path(day - timedelta(days=1))))
+
+    def test_trimmed_uploads_stay_in_the_aggregate(self):
+        frames = [make_frame(100 + index, seed=index) for index in range(3)]
+        client = APIClient()
+        with override_settings(ANALYTICS_RETENTION={"detail": 1}):
+            for frame in frames:
+                client.post('/api/upload/', {'file': to_csv(frame)}, format='multipart')
+        self.assertEqual(EquipmentSummary.objects.count(), 1)
+
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+        aggregate = client.get('/api/aggregate/', {'since': since}).json()
+        combined = pd.concat(frames, ignore_index=True)
+        self.assertEqual(aggregate['total_equipment'], len(combined))
+        self.assertEqual(sum(rollup['uploads'] for rollup in aggregate['rollups']), 2)
+        self.assertAlmostEqual(aggregate['avg_pressure'], combined["Pressure"].mean(), places=9)
+
+
+@override_settings(
+    ANALYTICS_WRITE_QUEUE={'enabled': False},
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.client = APIClient()
+
+    def upload(self, rows, seed):
+        # Versions change when the storing transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/upload/', {'file': to_csv(make_frame(rows, seed))}, format='multipart')
+
+    def test_uploads_invalidate_cached_responses(self):
+        self.upload(10, seed=12)
+        first = self.client.get('/api/summary/')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json()['total_equipment'], 10)
+
+        unchanged = self.client.get('/api/summary/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(unchanged.status_code, 304)
+
+        self.upload(20, seed=13)
+        changed = self.client.get('/api/summary/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.json()['total_equipment'], 20)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+
+    def test_worker_uploads_invalidate_cached_responses(self):
+        self.upload(10, seed=12)
+        etag = self.client.get('/api/history/')['ETag']
+
+        job = UploadJob()
+        job.file.save('upload.csv', ContentFile(make_frame(20, seed=13).to_csv(index=False).encode()), save=False)
+        job.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            workers.run_upload_job(job.pk)
+
+        response = self.client.get('/api/history/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([summary['total_equipment'] for summary in response.json()], [20, 10])
+
+
+@override_settings(
+    ANALYTICS_WRITE_QUEUE={'enabled': False},
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class ResumableUploadTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.client = APIClient()
+        self.data = make_frame(200, seed=14).to_csv(index=False).encode()
+        self.session = self.client.post('/api/uploads/', {'filename': 'plant.csv', 'size': len(self.data)}).json()
+        self.url = f"/api/uploads/{self.session['id']}/"
+
+    def put(self, start, end, body=None):
+        body = self.data[start:end + 1] if body is None else body
+        return self.client.generic(
+            'PUT', self.url, body, content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end}/{len(self.data)}',
+        )
+
+    def complete(self, **fields):
+        return self.client.post(f'{self.url}complete/', fields)
+
+    def test_chunks_are_assembled_and_summarised(self):
+        middle = len(self.data) // 2
+        self.assertEqual(self.put(0, middle - 1)['Upload-Offset'], str(middle))
+        self.assertEqual(self.put(middle, len(self.data) - 1)['Upload-Offset'], str(len(self.data)))
+        response = self.complete()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total_equipment'], 200)
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_out_of_order_chunk_is_a_conflict(self):
+        response = self.put(100, 199)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 0)
+        self.assertEqual(self.client.get(self.url)['Upload-Offset'], '0')
+
+    def test_short_body_advances_the_offset_by_what_arrived(self):
+        # A dropped connection delivers only part of the declared range
+        response = self.put(0, 999, body=self.data[:400])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(self.url)['Upload-Offset'], '400')
+        self.assertEqual(self.put(400, len(self.data) - 1).status_code, 200)
+        self.assertEqual(self.complete().status_code, 200)
+
+    def test_completing_early_is_a_conflict(self):
+        self.put(0, 99)
+        response = self.complete()
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 100)
+        self.assertTrue(UploadSession.objects.exists())
+
+    def test_async_completion_hands_the_part_file_to_a_job(self):
+        self.put(0, len(self.data) - 1)
+        part = UploadSession.objects.get().part_path
+        with mock.patch('analytics.views.submit_upload_job') as submit_upload_job, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.complete(mode='async')
+        self.assertEqual(response.status_code, 202)
+
+        job = UploadJob.objects.get(pk=response.json()['job_id'])
+        submit_upload_job.assert_called_once_with(job)
+        self.assertFalse(part.exists())
+        with job.file.open('rb') as file:
+            self.assertEqual(file.read(), self.data)
+        self.assertFalse(UploadSession.objects.exists())
+
+
+@override_settings(
+    ANALYTICS_WRITE_QUEUE={'enabled': False},
+    ANALYTICS_CSV_CHUNK_SIZE=1000,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class HistogramTests(TestCase):
+    def test_fixed_width_bins_are_exact(self):
+        frame = make_frame(5000, seed=15)
+        # A thin far tail, which sketch estimates tend to lose
+        frame.loc[:40, "Flowrate"] = np.linspace(400, 500, 41)
+        client = APIClient()
+        summary = client.post('/api/upload/', {'file': to_csv(frame)}, format='multipart').json()
+        histograms = client.get(f"/api/summaries/{summary['id']}/histograms/").json()['histograms']
+        for name, column in PARAMETERS.items():
+            fixed = histograms[name]['fixed']
+            counts, _ = np.histogram(frame[column].dropna(), bins=fixed['edges'])
+            self.assertEqual(fixed['counts'], counts.tolist(), msg=name)
+
+        pumps = frame[frame["Type"] == 'Pump']
+        response = client.get(f"/api/summaries/{summary['id']}/histograms/", {'type': 'Pump', 'kind': 'fixed'})
+        fixed = response.json()['histograms']['pressure']['fixed']
+        counts, _ = np.histogram(pumps["Pressure"].dropna(), bins=fixed['edges'])
+        self.assertEqual(fixed['counts'], counts.tolist())
+
+    def test_sketch_bins_keep_the_extremes(self):
+        rng = np.random.default_rng(16)
+        sketch = KLLSketch(k=50)
+        sketch.update(np.concatenate([rng.normal(0, 1, 100_000), [1000.0]]))
+        for kind in ['fixed', 'quantile']:
+            counts = sketch.histogram(bins=20, kind=kind)['counts']
+            self.assertGreaterEqual(counts[0], 1)
+            self.assertGreaterEqual(counts[-1], 1)
+            self.assertEqual(sum(counts), sketch.n)
+
+
+class CompressedUploadTests(TestCase):
+    def compressors(self):
+        compressors = {"gzip": gzip.compress, "bzip2": bz2.compress, "xz": lzma.compress}
+        if ingest.zstd is not None:
+            compressors["zstd"] = ingest.zstd.compress
+        elif ingest.zstandard is not None:
+            compressors["zstd"] = ingest.zstandard.ZstdCompressor().compress
+        return compressors
+
+    def test_compressed_uploads_match_plain_csv(self):
+        data = make_frame(2000, seed=17).to_csv(index=False).encode()
+        expected = accumulate(io.BytesIO(data)).summary()
+        for name, compress in self.compressors().items():
+            with self.subTest(compression=name):
+                summary = accumulate(io.BytesIO(compress(data)), chunk_size=300).summary()
+                self.assertEqual(summary['total_equipment'], expected['total_equipment'])
+                self.assertEqual(summary['type_distribution'], expected['type_distribution'])
+                for parameter, stats in expected['parameter_stats'].items():
+                    decompressed = summary['parameter_stats'][parameter]
+                    for key in ['count', 'nulls', 'min', 'max']:
+                        self.assertEqual(decompressed[key], stats[key])
+                    self.assertAlmostEqual(decompressed['mean'], stats['mean'], places=9)
+
+    def test_truncated_archive_is_rejected(self):
+        data = gzip.compress(make_frame(2000, seed=17).to_csv(index=False).encode())
+        with self.assertRaises(IngestError):
+            accumulate(io.BytesIO(data[:len(data) // 2]))
+
+
+def run_now(func, *args):
+    """Stands in for workers.submit, running ``func`` in this process (and its test database)."""
+    future = Future()
+    try:
+        future.set_result(func(*args))
+    except Exception as exc:
+        future.set_exception(exc)
+    return future
+
+
+@override_settings(
+    ANALYTICS_WRITE_QUEUE={'enabled': False},
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class BatchUploadTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.enterContext(mock.patch.object(batch, 'submit', run_now))
+        self.client = APIClient()
+
+    def post(self, files, **fields):
+        return self.client.post('/api/upload/batch/', {'files': files, **fields}, format='multipart')
+
+    def test_files_are_stored_together_with_one_trim(self):
+        first, second = make_frame(100, seed=18), make_frame(150, seed=19)
+        with mock.patch.object(pipeline, 'trim_history', wraps=pipeline.trim_history) as trim:
+            response = self.post([to_csv(first, 'a.csv'), to_csv(second, 'b.csv'), to_csv(first, 'c.csv')])
+        self.assertEqual(response.status_code, 200)
+        files = response.json()['files']
+        self.assertEqual([result['file'] for result in files], ['a.csv', 'b.csv', 'c.csv'])
+        self.assertEqual([result['deduplicated'] for result in files], [False, False, True])
+        self.assertEqual(files[2]['summary']['id'], files[0]['summary']['id'])
+        self.assertEqual(EquipmentSummary.objects.count(), 2)
+        self.assertEqual(trim.call_count, 1)
+        self.assertEqual(response.json()['merged']['total_equipment'], 100 + 150 + 100)
+
+    def test_zip_members_are_summarised(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zipped:
+            zipped.writestr('unit1.csv', make_frame(30, seed=20).to_csv(index=False))
+            zipped.writestr('units/unit2.csv', make_frame(40, seed=21).to_csv(index=False))
+            zipped.writestr('__MACOSX/units/._unit2.csv', b'resource fork')
+        upload = SimpleUploadedFile('units.zip', archive.getvalue(), content_type='application/zip')
+        files = self.post([upload]).json()['files']
+        self.assertEqual({result['file']: result['summary']['total_equipment'] for result in files},
+                         {'unit1.csv': 30, 'units/unit2.csv': 40})
+
+    def test_bad_file_only_fails_itself(self):
+        bad = SimpleUploadedFile('bad.csv', b'Equipment Name,Type,Flowrate,Pressure,Temperature\nA,Pump,abc,2,3\n')
+        files = self.post([to_csv(make_frame(30, seed=22)), bad]).json()['files']
+        self.assertEqual(files[0]['summary']['total_equipment'], 30)
+        self.assertIn('validation', files[1])
+        self.assertEqual(EquipmentSummary.objects.count(), 1)
+
+    def test_oversized_archive_is_rejected(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zipped:
+            zipped.writestr('zeros.csv', b'0' * 100_000)
+        upload = SimpleUploadedFile('bomb.zip', archive.getvalue(), content_type='application/zip')
+        with override_settings(ANALYTICS_BATCH_MAX_EXPANDED_SIZE=50_000):
+            response = self.post([upload])
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(
+    ANALYTICS_WRITE_QUEUE={'enabled': False},
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class DeduplicationTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.client = APIClient()
+        self.frame = make_frame(100, seed=23)
+
+    def upload(self, **fields):
+        return self.client.post('/api/upload/', {'file': to_csv(self.frame), **fields}, format='multipart')
+
+    def test_repeated_content_returns_the_stored_summary_unparsed(self):
+        first = self.upload()
+        self.assertEqual(first['X-Deduplicated'], 'false')
+        with mock.patch.object(pipeline, 'accumulate') as parse:
+            again = self.upload()
+        parse.assert_not_called()
+        self.assertEqual(again['X-Deduplicated'], 'true')
+        self.assertEqual(again.json()['id'], first.json()['id'])
+        self.assertEqual(EquipmentSummary.objects.count(), 1)
+
+    def test_force_parses_again(self):
+        first = self.upload()
+        forced = self.upload(force=True)
+        self.assertEqual(forced['X-Deduplicated'], 'false')
+        self.assertNotEqual(forced.json()['id'], first.json()['id'])
+        self.assertEqual(EquipmentSummary.objects.count(), 2)
+
+    def test_async_duplicate_is_done_at_once(self):
+        first = self.upload()
+        with mock.patch('analytics.views.submit_upload_job') as submit_upload_job:
+            job = self.upload(mode='async').json()
+        submit_upload_job.assert_not_called()
+        status = self.client.get(f"/api/jobs/{job['job_id']}/").json()
+        self.assertEqual(status['status'], UploadJob.DONE)
+        self.assertEqual(status['summary']['id'], first.json()['id'])
+
+
+@override_settings(
+    ANALYTICS_WRITE_QUEUE={'enabled': False},
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class ValidationTests(TestCase):
+    def upload(self, frame):
+        return APIClient().post('/api/upload/', {'file': to_csv(frame)}, format='multipart')
+
+    def test_malformed_numbers_are_reported_with_row_numbers(self):
+        frame = make_frame(500, seed=24).astype({"Flowrate": object})
+        frame.loc[[3, 250, 499], "Flowrate"] = 'n/a?'
+        # Early chunks parse cleanly; the typed parse fails later on
+        with override_settings(ANALYTICS_CSV_CHUNK_SIZE=100):
+            response = self.upload(frame)
+        self.assertEqual(response.status_code, 400)
+        report = response.json()['validation']
+        self.assertEqual(report['rows_checked'], 500)
+        invalid = report['errors']['invalid_number']
+        self.assertEqual(invalid['columns'], {"Flowrate": 3})
+        self.assertEqual(invalid['rows'], [4, 251, 500])
+        self.assertTrue(invalid['rejected'])
+        self.assertFalse(EquipmentSummary.objects.exists())
+
+    def test_ranges_and_types_are_checked(self):
+        frame = make_frame(200, seed=25)
+        frame.loc[10, "Pressure"] = -1.0
+        frame.loc[20, "Type"] = 'Teleporter'
+        rules = {'ranges': {"Pressure": (0, None)}, 'allowed_types': TYPES, 'sample_size': 1}
+        with override_settings(ANALYTICS_VALIDATION=rules):
+            errors = self.upload(frame).json()['validation']['errors']
+        self.assertEqual(errors['out_of_range']['rows'], [11])
+        self.assertEqual(errors['unknown_type']['rows'], [21])
+        self.assertIn('missing_value', errors)
+        self.assertFalse(errors['missing_value']['rejected'])
+
+    def test_missing_values_are_allowed(self):
+        response = self.upload(make_frame(200, seed=25))
+        self.assertEqual(response.status_code, 200)
+
+    def test_column_without_values_is_rejected(self):
+        frame = make_frame(50, seed=26)
+        frame["Temperature"] = np.nan
+        errors = self.upload(frame).json()['validation']['errors']
+        self.assertEqual(errors['no_values']['columns'], {"Temperature": 1})
+
+
+@override_settings(
+    ANALYTICS_WRITE_QUEUE={'enabled': False},
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class DiskUploadTests(TestCase):
+    def test_small_uploads_are_spooled_and_mapped(self):
+        with mock.patch('analytics.views.process_upload', wraps=pipeline.process_upload) as process_upload, \
+                mock.patch.object(ingest, '_release_consumed', wraps=ingest._release_consumed) as release:
+            response = APIClient().post('/api/upload/', {'file': to_csv(make_frame(10, seed=27))}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        file = process_upload.call_args.args[0]
+        self.assertIsInstance(file, TemporaryUploadedFile)
+        # Pages are released from the mapping as chunks are parsed
+        self.assertTrue(release.called)
+
+    def test_only_files_on_disk_have_a_local_path(self):
+        with tempfile.NamedTemporaryFile(suffix='.csv') as file:
+            self.assertEqual(ingest.get_local_path(file), file.name)
+        self.assertIsNone(ingest.get_local_path(io.BytesIO(b'data')))
+
+
+@override_settings(
+    ANALYTICS_WRITE_QUEUE={'enabled': False},
+    ANALYTICS_CSV_CHUNK_SIZE=128,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class ParameterStatsTests(TestCase):
+    def test_stats_match_pandas(self):
+        frame = make_frame(1000, seed=28)
+        client = APIClient()
+        client.post('/api/upload/', {'file': to_csv(frame)}, format='multipart')
+        for url in ['/api/summary/', '/api/history/']:
+            data = client.get(url).json()
+            summary = data[0] if isinstance(data, list) else data
+            for name, column in PARAMETERS.items():
+                with self.subTest(url=url, parameter=name):
+                    stats, values = summary['parameter_stats'][name], frame[column]
+                    self.assertEqual(stats['count'], values.count())
+                    self.assertEqual(stats['nulls'], values.isna().sum())
+                    self.assertEqual((stats['min'], stats['max']), (values.min(), values.max()))
+                    self.assertAlmostEqual(stats['mean'], values.mean(), places=9)
+                    self.assertAlmostEqual(stats['var'], values.var(), places=7)
+                    self.assertAlmostEqual(stats['std'], values.std(), places=9)
+
+    def test_single_value_has_no_spread(self):
+        frame = make_frame(1, seed=28).fillna(1.0)
+        stats = accumulate(io.BytesIO(frame.to_csv(index=False).encode())).summary()['parameter_stats']
+        self.assertEqual(stats['pressure']['count'], 1)
+        self.assertIsNone(stats['pressure']['var'])
+        self.assertIsNone(stats['pressure']['std'])
+
+
+@override_settings(
+    ANALYTICS_WRITE_QUEUE={'enabled': False},
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class TypeStatsTests(TestCase):
+    def test_type_stats_match_groupby(self):
+        frame = make_frame(1000, seed=29)
+        data = frame.to_csv(index=False).encode()
+        type_stats = accumulate(io.BytesIO(data), chunk_size=77).summary()['type_stats']
+        self.assertEqual(list(type_stats), frame["Type"].value_counts().index.tolist())
+        for type_name, group in frame.groupby("Type"):
+            self.assertEqual(type_stats[type_name]['count'], len(group))
+            for name, column in PARAMETERS.items():
+                stats, values = type_stats[type_name][name], group[column]
+                self.assertEqual(stats['count'], values.count())
+                self.assertEqual((stats['min'], stats['max']), (values.min(), values.max()))
+                self.assertAlmostEqual(stats['mean'], values.mean(), places=9)
+
+    def test_report_renders_type_stats(self):
+        client = APIClient()
+        client.post('/api/upload/', {'file': to_csv(make_frame(100, seed=29))}, format='multipart')
+        response = client.get('/api/report/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response.content.startswith(b'%PDF'))
+
+
+@override_settings(
+    ANALYTICS_WRITE_QUEUE={'enabled': False},
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class AggregateTests(TestCase):
+    def assertMatches(self, aggregate, frame):
+        self.assertEqual(aggregate['total_equipment'], len(frame))
+        self.assertEqual(aggregate['type_distribution'], frame["Type"].value_counts().to_dict())
+        for name, column in PARAMETERS.items():
+            self.assertAlmostEqual(aggregate[f'avg_{name}'], frame[column].mean(), places=9)
+            self.assertAlmostEqual(aggregate['parameter_stats'][name]['std'], frame[column].std(), places=9)
+
+    def test_fleet_and_selected_aggregates(self):
+        client = APIClient()
+        self.assertEqual(client.get('/api/aggregate/').status_code, 404)
+        frames = [make_frame(100 * (index + 1), seed=30 + index) for index in range(3)]
+        ids = [
+            client.post('/api/upload/', {'file': to_csv(frame)}, format='multipart').json()['id']
+            for frame in frames
+        ]
+
+        fleet = client.get('/api/aggregate/').json()
+        self.assertEqual((fleet['scope'], fleet['uploads']), ('fleet', 3))
+        self.assertMatches(fleet, pd.concat(frames, ignore_index=True))
+
+        selection = client.get('/api/aggregate/', {'ids': [ids[0], ids[2]]}).json()
+        self.assertEqual(sorted(selection['summaries']), [ids[0], ids[2]])
+        self.assertMatches(selection, pd.concat([frames[0], frames[2]], ignore_index=True))
+
+
+class CorrelationTests(TestCase):
+    def test_matrices_match_pandas(self):
+        frame = make_frame(2000, seed=33)
+        frame["Pressure"] = frame["Flowrate"] * 0.05 + np.random.default_rng(34).normal(0, 0.5, len(frame))
+        frame.loc[::40, "Pressure"] = np.nan
+        data = frame.to_csv(index=False).encode()
+        columns = list(PARAMETERS.values())
+        expected = {"covariance": frame[columns].cov(), "correlation": frame[columns].corr()}
+
+        head = accumulate(io.BytesIO(frame.iloc[:700].to_csv(index=False).encode()), chunk_size=64)
+        tail = accumulate(io.BytesIO(frame.iloc[700:].to_csv(index=False).encode()), chunk_size=64)
+        for source, accumulator in [("one pass", accumulate(io.BytesIO(data), chunk_size=64)),
+                                    ("merged", head.merge(tail))]:
+            correlations = accumulator.correlations()
+            self.assertEqual(correlations['parameters'], list(PARAMETERS))
+            for matrix, values in expected.items():
+                with self.subTest(source=source, matrix=matrix):
+                    np.testing.assert_allclose(correlations[matrix], values.to_numpy(), rtol=1e-9)
+
+
+@override_settings(
+    ANALYTICS_WRITE_QUEUE={'enabled': False},
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class OutlierEndpointTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.frame = make_frame(1000, seed=35)
+        self.frame.loc[[10, 500], "Pressure"] = 40.0
+
+    def outliers(self, summary_id, **query):
+        return self.client.get(f'/api/summaries/{summary_id}/outliers/', {'page_size': 1000, **query}).json()
+
+    def test_flagged_rows_are_filtered_by_parameter_and_method(self):
+        summary = self.client.post('/api/upload/', {'file': to_csv(self.frame)}, format='multipart').json()
+        rows = self.outliers(summary['id'], parameter='pressure', method='zscore')['results']
+        self.assertEqual([row['row'] for row in rows], [11, 501])
+        self.assertIn('pressure:zscore', rows[0]['flags'])
+        self.assertEqual(rows[0]['equipment_name'], 'E10')
+
+        temperature = self.outliers(summary['id'], parameter='temperature')['results']
+        self.assertTrue(all(any(flag.startswith('temperature:') for flag in row['flags']) for row in temperature))
+
+        page = self.client.get(f"/api/summaries/{summary['id']}/outliers/", {'page_size': 1}).json()
+        self.assertEqual(len(page['results']), 1)
+        self.assertIsNotNone(page['next'])
+
+    def test_by_type_judges_rows_against_their_own_type(self):
+        # Ordinary for the upload, far out for valves
+        self.frame.loc[self.frame["Type"] == 'Valve', "Temperature"] = 20.0
+        valve = self.frame.index[self.frame["Type"] == 'Valve'][0]
+        self.frame.loc[valve, "Temperature"] = 100.0
+        for by_type, flagged in [(False, False), (True, True)]:
+            with self.subTest(by_type=by_type), override_settings(ANALYTICS_OUTLIERS={'by_type': by_type}):
+                summary = self.client.post(
+                    '/api/upload/', {'file': to_csv(self.frame), 'force': True}, format='multipart',
+                ).json()
+                rows = self.outliers(summary['id'], parameter='temperature', type='Valve')['results']
+                self.assertEqual(valve + 1 in [row['row'] for row in rows], flagged)
+
+
+@override_settings(
+    ANALYTICS_WRITE_QUEUE={'enabled': False},
+    ANALYTICS_RETENTION={"detail": 1},
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class TypeTotalsTests(TestCase):
+    def test_totals_cover_trimmed_uploads_in_one_query(self):
+        client = APIClient()
+        frames = [make_frame(100 + index * 50, seed=36 + index) for index in range(3)]
+        for frame in frames:
+            client.post('/api/upload/', {'file': to_csv(frame)}, format='multipart')
+        self.assertEqual(EquipmentSummary.objects.count(), 1)
+
+        with self.assertNumQueries(1):
+            types = client.get('/api/types/', {'type': 'Pump'}).json()['types']
+        pumps = pd.concat(frames, ignore_index=True).query("Type == 'Pump'")
+        self.assertEqual(list(types), ['Pump'])
+        self.assertEqual((types['Pump']['uploads'], types['Pump']['count']), (3, len(pumps)))
+        self.assertAlmostEqual(types['Pump']['flowrate']['mean'], pumps["Flowrate"].mean(), places=9)
+        self.assertEqual(types['Pump']['pressure']['max'], pumps["Pressure"].max())
+
+        trend = client.get('/api/types/trend/', {'bucket': 'day', 'type': 'Pump'}).json()['trend']
+        self.assertEqual([row['count'] for row in trend], [len(pumps)])
+        since = (timezone.now() + timedelta(hours=1)).isoformat()
+        self.assertEqual(client.get('/api/types/', {'since': since}).json()['types'], {})
+
+    def test_appends_rewrite_the_type_rows(self):
+        client = APIClient()
+        base, delta = make_frame(100, seed=39), make_frame(60, seed=40, start=100)
+        summary = client.post('/api/upload/', {'file': to_csv(base)}, format='multipart').json()
+        client.post('/api/upload/', {'file': to_csv(delta), 'append_to': summary['id']}, format='multipart')
+        types = client.get('/api/types/').json()['types']
+        combined = pd.concat([base, delta], ignore_index=True)
+        self.assertEqual({name: totals['count'] for name, totals in types.items()},
+                         combined["Type"].value_counts().to_dict())
+
+
+@override_settings(
+    ANALYTICS_WRITE_QUEUE={'enabled': False},
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class TrendRollupTests(TestCase):
+    def accumulator(self, frame):
+        return accumulate(io.BytesIO(frame.to_csv(index=False).encode()))
+
+    def test_uploads_are_merged_into_their_buckets(self):
+        first, second = make_frame(100, seed=41), make_frame(200, seed=42)
+        # No pressure readings: the bucket's bounds come from the later upload
+        first["Pressure"] = np.nan
+        morning = timezone.make_aware(datetime(2026, 3, 4, 9, 15))
+        record_upload(morning, self.accumulator(first))
+        record_upload(morning + timedelta(hours=5), self.accumulator(second))
+
+        client = APIClient()
+        hourly = client.get('/api/trends/', {'bucket': 'hour'}).json()['points']
+        self.assertEqual([point['rows'] for point in hourly], [100, 200])
+
+        points = client.get('/api/trends/', {'bucket': 'day', 'param': 'pressure'}).json()['points']
+        self.assertEqual(len(points), 1)
+        point = points[0]
+        self.assertEqual((point['uploads'], point['rows']), (2, 300))
+        self.assertNotIn('flowrate', point)
+        self.assertEqual(point['pressure']['count'], second["Pressure"].count())
+        self.assertAlmostEqual(point['pressure']['mean'], second["Pressure"].mean(), places=9)
+        self.assertEqual(point['pressure']['min'], second["Pressure"].min())
+
+        weekly = client.get('/api/trends/', {'bucket': 'week'}).json()['points']
+        # 2026-03-04 is a Wednesday; weeks start on Monday
+        self.assertEqual(weekly[0]['start'], '2026-03-02T00:00:00Z')
+
+    def test_range_starts_at_the_bucket_holding_since(self):
+        morning = timezone.make_aware(datetime(2026, 3, 4, 9, 15))
+        for days in range(3):
+            record_upload(morning + timedelta(days=days), self.accumulator(make_frame(10, seed=days)))
+        points = APIClient().get('/api/trends/', {
+            'bucket': 'day', 'since': '2026-03-05T12:00:00Z', 'until': '2026-03-06T00:00:00Z',
+        }).json()['points']
+        self.assertEqual([point['start'] for point in points], ['2026-03-05T00:00:00Z'])
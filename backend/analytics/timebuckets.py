@@ -0,0 +1,26 @@
+"""
+Hour, day and week buckets shared by the rollup tables.
+
+SummaryRollup (retention) and TrendRollup (trend charts) both key their rows
+by the start of a bucket, and the TypeStat trends group with Django's Trunc
+functions. All of them follow the current time zone, so a given day or week
+covers the same span whichever endpoint reports it. Weeks start on Monday,
+as with TruncWeek.
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+
+HOUR = 'hour'
+DAY = 'day'
+WEEK = 'week'
+
+
+def bucket_start(moment, granularity):
+    """Start of the ``granularity`` bucket containing ``moment``, as an aware datetime."""
+    start = timezone.localtime(moment).replace(tzinfo=None, minute=0, second=0, microsecond=0)
+    if granularity != HOUR:
+        start = start.replace(hour=0)
+    if granularity == WEEK:
+        start -= timedelta(days=start.weekday())
+    return timezone.make_aware(start)
@@ -0,0 +1,88 @@
+"""
+Time-bucketed rollups for trend charts.
+
+Every upload adds its row count and each parameter's count, sum, min and max
+to the hourly, daily and weekly TrendRollup rows it falls in, with one
+INSERT ... ON CONFLICT DO UPDATE per bucket, in the upload's transaction. A
+trend over any range then reads one row per bucket, however many uploads it
+covers. Buckets come from timebuckets.bucket_start, as retention's do.
+"""
+from django.db import connection
+
+from .ingest import PARAMETERS
+from .models import TrendRollup
+from .timebuckets import bucket_start
+
+GRANULARITIES = [TrendRollup.HOUR, TrendRollup.DAY, TrendRollup.WEEK]
+
+
+def _upsert_sql():
+    quote = connection.ops.quote_name
+    table = quote(TrendRollup._meta.db_table)
+    added = ['uploads', 'rows']
+    lowest, highest = [], []
+    for name in PARAMETERS:
+        added += [f'{name}_count', f'{name}_sum']
+        lowest.append(f'{name}_min')
+        highest.append(f'{name}_max')
+    columns = ['granularity', 'bucket_start', *added, *lowest, *highest]
+
+    updates = [f'{quote(column)} = {table}.{quote(column)} + excluded.{quote(column)}' for column in added]
+    for bounds, op in ((lowest, '<'), (highest, '>')):
+        for column in bounds:
+            ours, theirs = f'{table}.{quote(column)}', f'excluded.{quote(column)}'
+            # Either side may be NULL (no values yet)
+            updates.append(
+                f'{quote(column)} = CASE WHEN {ours} IS NULL OR {theirs} {op} {ours} '
+                f'THEN {theirs} ELSE {ours} END'
+            )
+    return 'INSERT INTO {} ({}) VALUES ({}) ON CONFLICT ({}, {}) DO UPDATE SET {}'.format(
+        table,
+        ', '.join(quote(column) for column in columns),
+        ', '.join(['%s'] * len(columns)),
+        quote('granularity'), quote('bucket_start'),
+        ', '.join(updates),
+    )
+
+
+def record_upload(moment, accumulator, uploads=1):
+    """
+    Add an accumulator's rows to the buckets containing ``moment``. Appends
+    pass ``uploads=0`` so they add rows without counting a new upload.
+    """
+    added, lows, highs = [uploads, accumulator.rows], [], []
+    for name in PARAMETERS:
+        count, total, _, low, high = accumulator.moments[name]
+        added += [count, total]
+        lows.append(low)
+        highs.append(high)
+
+    params = []
+    for granularity in GRANULARITIES:
+        start = connection.ops.adapt_datetimefield_value(bucket_start(moment, granularity))
+        params.append([granularity, start, *added, *lows, *highs])
+    with connection.cursor() as cursor:
+        cursor.executemany(_upsert_sql(), params)
+
+
+def trend(granularity, names, since=None, until=None):
+    """Points ``{"start", "uploads", "rows", <name>: {count, mean, min, max}}``, oldest first."""
+    rollups = TrendRollup.objects.filter(granularity=granularity).order_by('bucket_start')
+    if since is not None:
+        rollups = rollups.filter(bucket_start__gte=bucket_start(since, granularity))
+    if until is not None:
+        rollups = rollups.filter(bucket_start__lt=until)
+
+    points = []
+    for rollup in rollups:
+        point = {"start": rollup.bucket_start, "uploads": rollup.uploads, "rows": rollup.rows}
+        for name in names:
+            count = getattr(rollup, f'{name}_count')
+            point[name] = {
+                "count": count,
+                "mean": getattr(rollup, f'{name}_sum') / count if count else None,
+                "min": getattr(rollup, f'{name}_min'),
+                "max": getattr(rollup, f'{name}_max'),
+            }
+        points.append(point)
+    return points
@@ -0,0 +1,94 @@
+"""
+Per-type counts and statistics in the TypeStat table.
+
+Each stored summary gets one row per equipment type, written in the same
+transaction as the summary. Totals and trends across uploads are then single
+GROUP BY queries over the (type, uploaded_at) index rather than a scan that
+decodes every summary's JSON.
+"""
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import TruncDay, TruncHour, TruncMonth, TruncWeek
+
+from .ingest import PARAMETERS
+from .models import TypeStat
+
+TRUNCATE = {
+    'hour': TruncHour,
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+
+def type_rows(summary):
+    """Unsaved TypeStat rows for a summary, from its type_distribution and type_stats."""
+    rows = []
+    for type_name, count in summary.type_distribution.items():
+        row = TypeStat(summary=summary, uploaded_at=summary.uploaded_at, type=type_name, count=count)
+        stats = summary.type_stats.get(type_name)
+        if stats is not None:
+            for name in PARAMETERS:
+                described = stats[name]
+                setattr(row, f'{name}_count', described["count"])
+                setattr(row, f'{name}_sum', described["mean"] * described["count"] if described["count"] else 0.0)
+                setattr(row, f'{name}_min', described["min"])
+                setattr(row, f'{name}_max', described["max"])
+        rows.append(row)
+    return rows
+
+
+def store_type_stats(summaries):
+    """(Re)write the TypeStat rows of ``summaries``; runs in the caller's transaction."""
+    TypeStat.objects.filter(summary__in=[summary.pk for summary in summaries]).delete()
+    TypeStat.objects.bulk_create([row for summary in summaries for row in type_rows(summary)])
+
+
+def _aggregates():
+    aggregates = {"uploads": Count('id'), "count": Sum('count')}
+    for name in PARAMETERS:
+        aggregates[f'{name}_count'] = Sum(f'{name}_count')
+        aggregates[f'{name}_sum'] = Sum(f'{name}_sum')
+        aggregates[f'{name}_min'] = Min(f'{name}_min')
+        aggregates[f'{name}_max'] = Max(f'{name}_max')
+    return aggregates
+
+
+def _describe(row):
+    described = {"uploads": row["uploads"], "count": row["count"]}
+    for name in PARAMETERS:
+        count = row[f'{name}_count']
+        described[name] = {
+            "count": count,
+            "mean": row[f'{name}_sum'] / count if count else None,
+            "min": row[f'{name}_min'],
+            "max": row[f'{name}_max'],
+        }
+    return described
+
+
+def filter_rows(type_name=None, since=None, until=None):
+    rows = TypeStat.objects.all()
+    if type_name is not None:
+        rows = rows.filter(type=type_name)
+    if since is not None:
+        rows = rows.filter(uploaded_at__gte=since)
+    if until is not None:
+        rows = rows.filter(uploaded_at__lt=until)
+    return rows
+
+
+def type_totals(rows):
+    """``{type: totals}`` over the given TypeStat rows, most common type first."""
+    totals = rows.values('type').annotate(**_aggregates()).order_by('-count', 'type')
+    return {row["type"]: _describe(row) for row in totals}
+
+
+def type_trend(rows, bucket):
+    """Totals per ``bucket`` (hour, day, week or month) and type, oldest first."""
+    trend = (
+        rows.annotate(period=TRUNCATE[bucket]('uploaded_at'))
+        .values('period', 'type')
+        .annotate(**_aggregates())
+        .order_by('period', '-count', 'type')
+    )
+    return [{"period": row["period"], "type": row["type"], **_describe(row)} for row in trend]
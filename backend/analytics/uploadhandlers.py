@@ -0,0 +1,23 @@
+"""
+Upload handler for equipment datasets.
+
+Django keeps small uploads in memory and copies larger ones to a temporary
+file. Here every upload goes straight to disk so the parser can memory-map it:
+concurrent uploads then share the page cache, and parsing does not create a
+separate Python-level buffer for each upload.
+"""
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+
+class DiskUploadHandler(TemporaryFileUploadHandler):
+    """
+    Always spool to a temporary file, regardless of FILE_UPLOAD_MAX_MEMORY_SIZE,
+    writing in larger pieces than Django's 64 KiB default.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.chunk_size = getattr(settings, 'ANALYTICS_UPLOAD_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
@@ -1,9 +1,27 @@
 from django.urls import path
-from .views import UploadCSV, SummaryView, HistoryView, generate_pdf
+from .views import (
+    UploadCSV, BatchUploadView, SummaryView, HistoryView, JobStatusView, UploadSessionCreateView,
+    UploadSessionView, UploadSessionCompleteView, SummaryRecordsView, QuantilesView,
+    SummaryHistogramsView, SummaryOutliersView, AggregateView, TypeTotalsView, TypeTrendView,
+    TrendsView, generate_pdf,
+)
 
 urlpatterns = [
     path('upload/', UploadCSV.as_view(), name='upload_csv'),
+    path('upload/batch/', BatchUploadView.as_view(), name='upload_batch'),
     path('summary/', SummaryView.as_view(), name='summary'),
     path('history/', HistoryView.as_view(), name='history'),
+    path('aggregate/', AggregateView.as_view(), name='aggregate'),
+    path('trends/', TrendsView.as_view(), name='trends'),
+    path('types/', TypeTotalsView.as_view(), name='type_totals'),
+    path('types/trend/', TypeTrendView.as_view(), name='type_trend'),
+    path('quantiles/', QuantilesView.as_view(), name='quantiles'),
+    path('summaries/<int:summary_id>/records/', SummaryRecordsView.as_view(), name='summary_records'),
+    path('summaries/<int:summary_id>/histograms/', SummaryHistogramsView.as_view(), name='summary_histograms'),
+    path('summaries/<int:summary_id>/outliers/', SummaryOutliersView.as_view(), name='summary_outliers'),
     path('report/', generate_pdf, name='generate_pdf'),
+    path('jobs/<uuid:job_id>/', JobStatusView.as_view(), name='job_status'),
+    path('uploads/', UploadSessionCreateView.as_view(), name='upload_session_create'),
+    path('uploads/<uuid:session_id>/', UploadSessionView.as_view(), name='upload_session'),
+    path('uploads/<uuid:session_id>/complete/', UploadSessionCompleteView.as_view(), name='upload_session_complete'),
 ]
\ No newline at end of file
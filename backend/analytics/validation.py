@@ -0,0 +1,128 @@
+"""
+Row-level validation of uploaded equipment data.
+
+Checks run column-wise on whole chunks (boolean masks, no per-row Python), so
+validation costs about as much as parsing. The report gives a count per error
+class and column plus a capped sample of offending row numbers (1-based, not
+counting the header).
+"""
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from .ingest import PARAMETERS
+
+MISSING_VALUE = 'missing_value'
+INVALID_NUMBER = 'invalid_number'
+OUT_OF_RANGE = 'out_of_range'
+UNKNOWN_TYPE = 'unknown_type'
+# A parameter column without a single value (including uploads with no rows)
+NO_VALUES = 'no_values'
+
+ERROR_CLASSES = [MISSING_VALUE, INVALID_NUMBER, OUT_OF_RANGE, UNKNOWN_TYPE, NO_VALUES]
+
+DEFAULT_RULES = {
+    # Inclusive (min, max) per parameter column, e.g. {'Flowrate': (0, None)};
+    # None leaves a side open. Open by default, since gauge pressures and
+    # other signed readings are legitimate; infinities are always out of range.
+    'ranges': {},
+    # None accepts any equipment type
+    'allowed_types': None,
+    # Error classes that cause the upload to be rejected. Missing values are
+    # reported but allowed, since the averages skip them.
+    'reject': [INVALID_NUMBER, OUT_OF_RANGE, UNKNOWN_TYPE, NO_VALUES],
+    # Offending row numbers kept per error class
+    'sample_size': 20,
+}
+
+
+def get_rules():
+    return {**DEFAULT_RULES, **getattr(settings, 'ANALYTICS_VALIDATION', {})}
+
+
+class Validator:
+    """Accumulates validation results over a stream of DataFrame chunks."""
+
+    def __init__(self, rules=None):
+        self.rules = rules or get_rules()
+        self.reset()
+
+    def reset(self):
+        self.rows = 0
+        self.counts = {error: {} for error in ERROR_CLASSES}
+        self.samples = {error: set() for error in ERROR_CLASSES}
+        self.present = {column: 0 for column in PARAMETERS.values()}
+
+    def _record(self, error, column, mask, offset):
+        mask = np.asarray(mask, dtype=bool)
+        count = int(mask.sum())
+        if not count:
+            return
+        self.counts[error][column] = self.counts[error].get(column, 0) + count
+        room = self.rules['sample_size'] - len(self.samples[error])
+        if room > 0:
+            self.samples[error].update((np.flatnonzero(mask)[:room] + offset + 1).tolist())
+
+    def check(self, chunk):
+        """
+        Validate one chunk. Parameter columns read as text are converted to
+        float64 in place so the chunk can still be aggregated.
+        """
+        offset = self.rows
+        self.rows += len(chunk)
+
+        types = chunk["Type"]
+        self._record(MISSING_VALUE, "Type", types.isna(), offset)
+        allowed = self.rules['allowed_types']
+        if allowed is not None:
+            self._record(UNKNOWN_TYPE, "Type", types.notna() & ~types.isin(allowed), offset)
+
+        for column in PARAMETERS.values():
+            raw = chunk[column]
+            missing = raw.isna()
+            if pd.api.types.is_float_dtype(raw):
+                values = raw
+            else:
+                values = pd.to_numeric(raw, errors='coerce').astype('float64')
+                self._record(INVALID_NUMBER, column, values.isna() & ~missing, offset)
+                chunk[column] = values
+            self._record(MISSING_VALUE, column, missing, offset)
+            self.present[column] += int(values.notna().sum())
+
+            present = values.to_numpy()
+            with np.errstate(invalid='ignore'):
+                out = np.isinf(present)
+                low, high = self.rules['ranges'].get(column, (None, None))
+                if low is not None:
+                    out |= present < low
+                if high is not None:
+                    out |= present > high
+            self._record(OUT_OF_RANGE, column, out, offset)
+
+    def finish(self):
+        """
+        Checks that need the whole upload; call once after the last chunk.
+        A column with no values (or an upload with no rows) has no average.
+        """
+        for column, count in self.present.items():
+            if not count:
+                self.counts[NO_VALUES][column] = 1
+
+    @property
+    def rejected(self):
+        return any(self.counts[error] for error in self.rules['reject'])
+
+    def report(self):
+        return {
+            "rows_checked": self.rows,
+            "errors": {
+                error: {
+                    "count": sum(self.counts[error].values()),
+                    "columns": self.counts[error],
+                    "rows": sorted(self.samples[error])[:self.rules['sample_size']],
+                    "rejected": error in self.rules['reject'],
+                }
+                for error in ERROR_CLASSES
+                if self.counts[error]
+            },
+        }
@@ -1,13 +1,92 @@
 from rest_framework.views import APIView
+from rest_framework.generics import ListAPIView
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework import status
+from django.db import transaction
+from django.db.models import F
 from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 from datetime import datetime
-from .serializers import CSVUploadSerializer
-from .models import EquipmentSummary
-import pandas as pd
+from .serializers import (
+    AggregateQuerySerializer, BatchUploadSerializer, CSVUploadSerializer, EquipmentRecordSerializer,
+    EquipmentSummarySerializer, HistogramQuerySerializer, OutlierQuerySerializer,
+    OutlierRowSerializer, QuantileQuerySerializer, RecordQuerySerializer, TrendQuerySerializer,
+    TypeQuerySerializer,
+    TypeTrendQuerySerializer,
+    UploadCompleteSerializer, UploadJobSerializer, UploadSessionSerializer,
+)
+from .models import (
+    EquipmentRecord, EquipmentSummary, FleetAggregate, OutlierRow, SummaryRollup, UploadJob,
+    UploadSession,
+)
+from .pagination import RecordCursorPagination
+from .aggregates import FLEET_ID, merge_summaries
+from .batch import process_batch
+from .cache import cached_data, version_etag, version_modified
+from .ingest import PARAMETERS, IngestError, SummaryAccumulator
+from .outliers import METHODS, flag_bit
+from .pipeline import append_upload, file_digest, find_duplicate, process_upload
+from .records import records_enabled
+from .resumable import RangeError, move_to_media, parse_content_range, write_range
+from .sketches import KLLSketch
+from .trends import trend
+from .typestats import filter_rows, type_totals, type_trend
+from .workers import submit_upload_job
+from .writequeue import run_write
+import io
+
+# Clients may keep a copy but must revalidate it (cheaply, via ETag) before use
+CACHE_HEADERS = {"Cache-Control": "no-cache"}
+
+
+def create_job(file=None, **fields):
+    """
+    Save an UploadJob through the write queue. An uploaded file is copied to
+    storage first, so the writer only inserts the row.
+    """
+    job = UploadJob(**fields)
+    if isinstance(file, str):
+        job.file.name = file
+    elif file is not None:
+        job.file.save(file.name, file, save=False)
+    run_write(job.save)
+    return job
+
+
+def queue_upload_job(file, digest, force=False):
+    """
+    Start a background job for an upload. Content that was already summarised
+    (and not forced) gets a job that is done immediately, without parsing.
+    """
+    existing = None if force else find_duplicate(digest)
+    if existing is not None:
+        job = create_job(status=UploadJob.DONE, summary=existing)
+    else:
+        job = create_job(file, force=force)
+        transaction.on_commit(lambda: submit_upload_job(job))
+    return Response(
+        {"job_id": job.pk, "status": job.status},
+        status=status.HTTP_202_ACCEPTED,
+    )
+
+
+def ingest_error_response(exc):
+    data = {"detail": str(exc)}
+    if exc.errors is not None:
+        data["validation"] = exc.errors
+    return Response(data, status=status.HTTP_400_BAD_REQUEST)
+
+
+def summary_response(record, created):
+    return Response(
+        EquipmentSummarySerializer(record).data,
+        headers={"X-Deduplicated": "false" if created else "true"},
+    )
 
 
 class UploadCSV(APIView):
@@ -19,60 +98,431 @@ class UploadCSV(APIView):
         serializer.is_valid(raise_exception=True)
 
         file = serializer.validated_data['file']
-        df = pd.read_csv(file)
+        force = serializer.validated_data['force']
+        append_to = serializer.validated_data.get('append_to')
+        if append_to is not None:
+            return self.append(file, append_to, serializer.validated_data['mode'])
+
+        digest = file_digest(file)
+
+        if serializer.validated_data['mode'] == 'async':
+            # Save the upload and let a worker process compute the summary
+            return queue_upload_job(file, digest, force)
+
+        try:
+            # Saves to DB and applies the retention tiers
+            record, created = process_upload(file, digest, force)
+        except IngestError as exc:
+            return ingest_error_response(exc)
+
+        return summary_response(record, created)
+
+    def append(self, file, summary, mode):
+        if mode == 'async':
+            job = create_job(file, append_to=summary)
+            transaction.on_commit(lambda: submit_upload_job(job))
+            return Response(
+                {"job_id": job.pk, "status": job.status},
+                status=status.HTTP_202_ACCEPTED,
+            )
 
-        summary = {
-            "total_equipment": len(df),
-            "avg_flowrate": df["Flowrate"].mean(),
-            "avg_pressure": df["Pressure"].mean(),
-            "avg_temperature": df["Temperature"].mean(),
-            "type_distribution": df["Type"].value_counts().to_dict()
-        }
+        try:
+            record = append_upload(file, summary.pk)
+        except IngestError as exc:
+            return ingest_error_response(exc)
+
+        return summary_response(record, True)
+
+
+class BatchUploadView(APIView):
+    parser_classes = (MultiPartParser, FormParser)
+    serializer_class = BatchUploadSerializer
+
+    def post(self, request):
+        serializer = BatchUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            result = process_batch(
+                serializer.validated_data['files'],
+                force=serializer.validated_data['force'],
+            )
+        except IngestError as exc:
+            return ingest_error_response(exc)
+
+        return Response(result)
+
+
+class UploadSessionCreateView(APIView):
+    def post(self, request):
+        serializer = UploadSessionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        run_write(serializer.save)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        # Save to DB
-        EquipmentSummary.objects.create(**summary)
 
-        # Keep only last 5
-        qs = EquipmentSummary.objects.order_by('-uploaded_at')
-        if qs.count() > 5:
-            for old in qs[5:]:
-                old.delete()
+class UploadSessionView(APIView):
+    def get(self, request, session_id):
+        session = get_object_or_404(UploadSession, pk=session_id)
+        return Response(
+            UploadSessionSerializer(session).data,
+            headers={"Upload-Offset": str(session.offset)},
+        )
 
-        return Response(summary)
+    def put(self, request, session_id):
+        session = get_object_or_404(UploadSession, pk=session_id)
+        try:
+            start, length, total = parse_content_range(request.headers.get('Content-Range'))
+            if total is not None and session.size is not None and total != session.size:
+                raise RangeError(f"Upload size is {session.size} bytes, not {total}.")
+            write_range(session, request.stream or io.BytesIO(), start, length)
+        except RangeError as exc:
+            return Response(
+                {"detail": str(exc), "offset": session.offset},
+                status=status.HTTP_409_CONFLICT,
+                headers={"Upload-Offset": str(session.offset)},
+            )
+        return Response(
+            UploadSessionSerializer(session).data,
+            headers={"Upload-Offset": str(session.offset)},
+        )
+
+    def delete(self, request, session_id):
+        session = get_object_or_404(UploadSession, pk=session_id)
+        session.part_path.unlink(missing_ok=True)
+        run_write(session.delete)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class UploadSessionCompleteView(APIView):
+    def post(self, request, session_id):
+        session = get_object_or_404(UploadSession, pk=session_id)
+        serializer = UploadCompleteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        if session.size is not None and session.offset != session.size:
+            return Response(
+                {"detail": f"Upload incomplete: received {session.offset} of {session.size} bytes.",
+                 "offset": session.offset},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        force = serializer.validated_data['force']
+        with open(session.part_path, 'rb') as file:
+            digest = file_digest(file)
+
+        if serializer.validated_data['mode'] == 'async':
+            if not force and find_duplicate(digest) is not None:
+                session.part_path.unlink(missing_ok=True)
+                file = None
+            else:
+                # Hand the assembled file to a worker without copying it
+                upload_to = UploadJob._meta.get_field('file').upload_to
+                file = move_to_media(session, upload_to)
+            run_write(session.delete)
+            return queue_upload_job(file, digest, force)
+
+        try:
+            with open(session.part_path, 'rb') as file:
+                record, created = process_upload(file, digest, force)
+        except IngestError as exc:
+            return ingest_error_response(exc)
+        finally:
+            session.part_path.unlink(missing_ok=True)
+            run_write(session.delete)
+
+        return summary_response(record, created)
+
+
+# Only uploads change these, so polls revalidate against the cache version
+cached_get = method_decorator(condition(etag_func=version_etag, last_modified_func=version_modified))
+
+
+def latest_summary_data():
+    latest = EquipmentSummary.objects.order_by('-uploaded_at').first()
+    if latest:
+        return EquipmentSummarySerializer(latest).data
+    return {"detail": "No summary available. Please upload a CSV first."}
+
+
+def history_data():
+    summaries = EquipmentSummary.objects.order_by('-uploaded_at')[:5]
+    return EquipmentSummarySerializer(summaries, many=True).data
 
 
 class SummaryView(APIView):
+    @cached_get
     def get(self, request):
-        latest = EquipmentSummary.objects.order_by('-uploaded_at').first()
-        if latest:
-            data = {
-                "total_equipment": latest.total_equipment,
-                "avg_flowrate": latest.avg_flowrate,
-                "avg_pressure": latest.avg_pressure,
-                "avg_temperature": latest.avg_temperature,
-                "type_distribution": latest.type_distribution,
-                "uploaded_at": latest.uploaded_at
-            }
-            return Response(data)
-        else:
-            return Response({"detail": "No summary available. Please upload a CSV first."})
+        return Response(cached_data('summary', latest_summary_data), headers=CACHE_HEADERS)
 
 
 class HistoryView(APIView):
+    @cached_get
     def get(self, request):
-        summaries = EquipmentSummary.objects.order_by('-uploaded_at')[:5]
-        data = [
-            {
-                "total_equipment": s.total_equipment,
-                "avg_flowrate": s.avg_flowrate,
-                "avg_pressure": s.avg_pressure,
-                "avg_temperature": s.avg_temperature,
-                "type_distribution": s.type_distribution,
-                "uploaded_at": s.uploaded_at
-            }
-            for s in summaries
-        ]
-        return Response(data)
+        return Response(cached_data('history', history_data), headers=CACHE_HEADERS)
+
+
+class AggregateView(APIView):
+    """
+    Combined summary across uploads, merged from stored statistics.
+
+    Without filters this is the running aggregate of every upload so far.
+    ?ids=1&ids=2 and/or ?since=&until= (ISO datetimes, on uploaded_at) merge
+    the matching stored summaries instead; a time range also takes in the
+    hourly and daily rollups of summaries that retention has already trimmed.
+    """
+
+    def get(self, request):
+        serializer = AggregateQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        query = serializer.validated_data
+
+        if not query:
+            fleet = FleetAggregate.objects.filter(pk=FLEET_ID).first()
+            if fleet is None or not fleet.stats["rows"]:
+                return Response({"detail": "No uploads yet."}, status=status.HTTP_404_NOT_FOUND)
+            merged = SummaryAccumulator.from_state(fleet.stats)
+            return Response({
+                "scope": "fleet",
+                "uploads": fleet.uploads,
+                "updated_at": fleet.updated_at,
+                **merged.summary(),
+            })
+
+        summaries = EquipmentSummary.objects.order_by('-uploaded_at')
+        if 'ids' in query:
+            summaries = summaries.filter(pk__in=query['ids'])
+        if 'since' in query:
+            summaries = summaries.filter(uploaded_at__gte=query['since'])
+        if 'until' in query:
+            summaries = summaries.filter(uploaded_at__lt=query['until'])
+        summaries = list(summaries)
+
+        rollups = []
+        if 'ids' not in query:
+            rollups = SummaryRollup.objects.order_by('bucket_start')
+            if 'since' in query:
+                rollups = rollups.filter(bucket_start__gte=query['since'])
+            if 'until' in query:
+                rollups = rollups.filter(bucket_start__lt=query['until'])
+            rollups = list(rollups)
+        if not summaries and not rollups:
+            return Response({"detail": "No summaries match."}, status=status.HTTP_404_NOT_FOUND)
+
+        merged, approximate = merge_summaries(summaries)
+        for rollup in rollups:
+            merged.merge(SummaryAccumulator.from_state(rollup.stats))
+        return Response({
+            "scope": "selection",
+            "summaries": [summary.pk for summary in summaries],
+            "rollups": [
+                {"granularity": rollup.granularity, "start": rollup.bucket_start, "uploads": rollup.uploads}
+                for rollup in rollups
+            ],
+            "approximate": approximate,
+            **merged.summary(),
+        })
+
+
+class TrendsView(APIView):
+    """
+    Parameter trends read from the hourly, daily or weekly rollups: one point
+    per bucket with uploads, rows and the count, mean, min and max of
+    ?param= (all parameters if omitted). ?since= and ?until= bound the range.
+    """
+
+    def get(self, request):
+        serializer = TrendQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        query = serializer.validated_data
+        names = [query['param']] if 'param' in query else list(PARAMETERS)
+        return Response({
+            "bucket": query['bucket'],
+            "points": trend(query['bucket'], names, query.get('since'), query.get('until')),
+        })
+
+
+class TypeTotalsView(APIView):
+    """
+    Equipment counts and parameter statistics per type across uploads, as one
+    SQL aggregate. Filter with ?type=, ?since= and ?until= (on uploaded_at);
+    uploads already trimmed by retention are still counted.
+    """
+
+    def get(self, request):
+        serializer = TypeQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        query = serializer.validated_data
+        rows = filter_rows(query.get('type'), query.get('since'), query.get('until'))
+        return Response({"types": type_totals(rows)})
+
+
+class TypeTrendView(APIView):
+    """Per-type totals grouped by ?bucket=hour|day|week|month, with the same filters."""
+
+    def get(self, request):
+        serializer = TypeTrendQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        query = serializer.validated_data
+        rows = filter_rows(query.get('type'), query.get('since'), query.get('until'))
+        return Response({"bucket": query['bucket'], "trend": type_trend(rows, query['bucket'])})
+
+
+class QuantilesView(APIView):
+    """
+    Percentiles across several uploads, merged from their stored sketches
+    without reading any rows. Query: ?ids=1&ids=2&q=0.5&q=0.99&parameter=pressure
+    """
+
+    def get(self, request):
+        serializer = QuantileQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        query = serializer.validated_data
+
+        summaries = EquipmentSummary.objects.order_by('-uploaded_at')
+        if 'ids' in query:
+            summaries = summaries.filter(pk__in=query['ids'])
+        names = [query['parameter']] if 'parameter' in query else list(PARAMETERS)
+
+        merged = {name: KLLSketch() for name in names}
+        used, skipped = [], []
+        for summary in summaries.only('id', 'stats'):
+            sketches = summary.stats.get('sketches', {})
+            if not all(name in sketches for name in names):
+                # Uploaded before sketches were stored
+                skipped.append(summary.pk)
+                continue
+            for name in names:
+                merged[name].merge(KLLSketch.from_state(sketches[name]))
+            used.append(summary.pk)
+
+        return Response({
+            "summaries": used,
+            "skipped": skipped,
+            "rank_error": max(sketch.rank_error() for sketch in merged.values()),
+            "quantiles": {
+                name: {
+                    "count": sketch.n,
+                    "values": dict(zip(map(str, query['q']), sketch.quantiles(query['q']))),
+                }
+                for name, sketch in merged.items()
+            },
+        })
+
+
+class SummaryHistogramsView(APIView):
+    """
+    Stored histogram bins of one upload, for drawing distributions without
+    fetching rows. Narrow with ?parameter=, ?kind=fixed|quantile and ?type=.
+    """
+
+    def get(self, request, summary_id):
+        serializer = HistogramQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        query = serializer.validated_data
+
+        summary = get_object_or_404(EquipmentSummary.objects.only('id', 'histograms'), pk=summary_id)
+        if not summary.histograms:
+            return Response(
+                {"detail": "No histograms stored for this upload."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        if 'type' in query:
+            histograms = summary.histograms['types'].get(query['type'])
+            if histograms is None:
+                return Response(
+                    {"detail": f"No histograms for type '{query['type']}'."},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+        else:
+            histograms = summary.histograms['parameters']
+
+        if 'parameter' in query:
+            histograms = {query['parameter']: histograms[query['parameter']]}
+        if 'kind' in query:
+            histograms = {name: {query['kind']: kinds[query['kind']]} for name, kinds in histograms.items()}
+
+        return Response({
+            "summary": summary.pk,
+            "type": query.get('type'),
+            "histograms": histograms,
+        })
+
+
+class SummaryRecordsView(ListAPIView):
+    """
+    Stored rows of one upload, optionally filtered by ?type= and by inclusive
+    ?<parameter>_min= / ?<parameter>_max= bounds. Rows load after the summary
+    is stored; the summary's records_loaded says when all are in. With row
+    storage disabled (ANALYTICS_STORE_RECORDS) uploads have no rows: 409.
+    """
+
+    serializer_class = EquipmentRecordSerializer
+    pagination_class = RecordCursorPagination
+
+    def list(self, request, *args, **kwargs):
+        summary = get_object_or_404(EquipmentSummary, pk=self.kwargs['summary_id'])
+        if not summary.records_loaded and not records_enabled():
+            return Response(
+                {"detail": "Row storage is disabled, so this upload's rows were not kept."},
+                status=status.HTTP_409_CONFLICT,
+            )
+        return super().list(request, *args, **kwargs)
+
+    def get_queryset(self):
+        query = RecordQuerySerializer(data=self.request.query_params)
+        query.is_valid(raise_exception=True)
+        query = query.validated_data
+
+        # Filtered within one summary's rows; the parameters are not indexed
+        qs = EquipmentRecord.objects.filter(summary_id=self.kwargs['summary_id'])
+        if 'type' in query:
+            qs = qs.filter(type=query['type'])
+        for name in PARAMETERS:
+            if f'{name}_min' in query:
+                qs = qs.filter(**{f'{name}__gte': query[f'{name}_min']})
+            if f'{name}_max' in query:
+                qs = qs.filter(**{f'{name}__lte': query[f'{name}_max']})
+        return qs
+
+
+class SummaryOutliersView(ListAPIView):
+    """
+    Rows of one upload flagged as outliers, in file order. Narrow with
+    ?parameter=, ?method=zscore|iqr and ?type=. The scan runs after the
+    summary is stored; the summary's outliers_loaded says when it is done.
+    """
+
+    serializer_class = OutlierRowSerializer
+    pagination_class = RecordCursorPagination
+
+    def get_queryset(self):
+        summary = get_object_or_404(EquipmentSummary, pk=self.kwargs['summary_id'])
+        query = OutlierQuerySerializer(data=self.request.query_params)
+        query.is_valid(raise_exception=True)
+        query = query.validated_data
+
+        qs = OutlierRow.objects.filter(summary=summary)
+        if 'type' in query:
+            qs = qs.filter(type=query['type'])
+        if 'parameter' in query or 'method' in query:
+            names = [query['parameter']] if 'parameter' in query else list(PARAMETERS)
+            methods = [query['method']] if 'method' in query else METHODS
+            mask = sum(flag_bit(name, method) for name in names for method in methods)
+            qs = qs.alias(matched=F('flags').bitand(mask)).filter(matched__gt=0)
+        return qs
+
+
+class JobStatusView(APIView):
+    def get(self, request, job_id):
+        job = get_object_or_404(UploadJob.objects.select_related('summary'), pk=job_id)
+        return Response(UploadJobSerializer(job).data)
+
+
+def format_type_stat(stats):
+    if stats["mean"] is None:
+        return "-"
+    return f"{stats['mean']:.2f} ({stats['min']:.2f}-{stats['max']:.2f})"
 
 
 # PDF Endpoint
@@ -111,6 +561,28 @@ def generate_pdf(request):
         p.drawString(70, y, f"{u.uploaded_at.strftime('%Y-%m-%d %H:%M')} | Total: {u.total_equipment} | Flowrate: {u.avg_flowrate:.2f} | Pressure: {u.avg_pressure:.2f} | Temp: {u.avg_temperature:.2f}")
         y -= 20
 
+    # Per-type breakdown of the latest upload
+    if latest and latest.type_stats:
+        y -= 20
+        p.setFont("Helvetica-Bold", 12)
+        p.drawString(50, y, "By Equipment Type (mean, min-max):")
+        y -= 20
+        columns = [("Type", 70), ("Count", 170), ("Flowrate", 220), ("Pressure", 340), ("Temperature", 460)]
+        p.setFont("Helvetica-Bold", 9)
+        for label, x in columns:
+            p.drawString(x, y, label)
+        p.setFont("Helvetica", 9)
+        for type_name, stats in latest.type_stats.items():
+            y -= 16
+            if y < 50:
+                p.showPage()
+                p.setFont("Helvetica", 9)
+                y = height - 50
+            p.drawString(70, y, str(type_name)[:20])
+            p.drawString(170, y, str(stats["count"]))
+            for (name, x) in zip(PARAMETERS, (220, 340, 460)):
+                p.drawString(x, y, format_type_stat(stats[name]))
+
     # Footer
     p.setFont("Helvetica-Oblique", 9)
     p.drawString(50, 30, "Generated by Chemical Equipment Visualizer")
@@ -0,0 +1,193 @@
+"""
+Local process pool for background upload jobs.
+
+Jobs are handed to a ProcessPoolExecutor owned by the web process, so no
+external broker is needed. Worker processes are spawned (not forked) and set
+up Django themselves, so they never share the parent's database connections.
+
+A pool whose worker died (e.g. killed for running out of memory) is broken
+for good, so it is replaced on the next submission, and the jobs it was
+running are marked failed. Jobs are owned by the web process that accepted
+them: when it starts serving, jobs a previous run left running are failed
+and jobs it left queued are submitted again.
+"""
+import functools
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.signals import request_started
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+RECOVER_UID = 'analytics.workers.recover_jobs'
+
+
+def _init_worker(settings_module):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'ANALYTICS_WORKER_PROCESSES', 2),
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(os.environ['DJANGO_SETTINGS_MODULE'],),
+            )
+        return _executor
+
+
+def discard_executor(executor):
+    """Drop a broken pool so the next get_executor() starts a new one."""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def submit(func, *args):
+    """Submit ``func`` to the pool, replacing the pool once if it is broken."""
+    executor = get_executor()
+    try:
+        return executor.submit(func, *args)
+    except BrokenProcessPool:
+        logger.warning("Worker pool is broken; starting a new one")
+        discard_executor(executor)
+        return get_executor().submit(func, *args)
+
+
+def run_upload_job(job_id):
+    """Worker entry point: compute and store the summary for an UploadJob."""
+    from .ingest import IngestError
+    from .models import UploadJob
+    from .pipeline import append_upload, process_upload
+    from .writequeue import run_write
+
+    job = UploadJob.objects.get(pk=job_id)
+    job.status = UploadJob.RUNNING
+    run_write(job.save, update_fields=['status', 'updated_at'])
+
+    try:
+        with job.file.open('rb') as file:
+            if job.append_to_id is not None:
+                job.summary = append_upload(file, job.append_to_id)
+            else:
+                job.summary, _ = process_upload(file, force=job.force)
+        job.status = UploadJob.DONE
+    except IngestError as exc:
+        job.status = UploadJob.FAILED
+        job.error = str(exc)
+        job.validation = exc.errors
+    except Exception as exc:
+        logger.exception("Upload job %s failed", job_id)
+        job.status = UploadJob.FAILED
+        job.error = str(exc)
+
+    job.file.delete(save=False)
+    run_write(job.save)
+
+
+def accumulate_path(path):
+    """Worker entry point: parse a file on disk and return its SummaryAccumulator."""
+    from .ingest import accumulate
+    from .validation import Validator
+
+    with open(path, 'rb') as file:
+        return accumulate(file, validator=Validator())
+
+
+def load_outliers_path(summary_id, path):
+    """
+    Worker entry point: scan a file on disk for the outliers of its stored
+    summary (see outliers.load_outliers). Returns the number stored.
+    """
+    from .ingest import SummaryAccumulator
+    from .models import EquipmentSummary
+    from .outliers import load_outliers
+
+    summary = EquipmentSummary.objects.get(pk=summary_id)
+    with open(path, 'rb') as file:
+        load_outliers(summary, file, SummaryAccumulator.from_state(summary.stats))
+    return summary.outlier_count
+
+
+def fail_job(job_id, error):
+    """Mark a job that has not finished as failed. Call it through run_write."""
+    from .models import UploadJob
+
+    job = UploadJob.objects.filter(pk=job_id, status__in=[UploadJob.QUEUED, UploadJob.RUNNING]).first()
+    if job is None:
+        return
+    job.file.delete(save=False)
+    job.status = UploadJob.FAILED
+    job.error = error
+    job.save()
+
+
+def _job_finished(job_id, future):
+    """Done-callback: fail the job if its worker never got to record a result."""
+    from .writequeue import run_write
+
+    if future.cancelled():
+        error = "The job was cancelled before it ran."
+    elif future.exception() is not None:
+        exc = future.exception()
+        logger.error("Upload job %s did not complete", job_id, exc_info=exc)
+        error = f"The worker process failed: {exc}"
+    else:
+        return
+    run_write(fail_job, job_id, error)
+
+
+def submit_upload_job(job):
+    """Hand a saved job to the pool; the job is failed if that is not possible."""
+    from .writequeue import run_write
+
+    try:
+        future = submit(run_upload_job, job.pk)
+    except Exception as exc:
+        logger.exception("Could not submit upload job %s", job.pk)
+        run_write(fail_job, job.pk, f"Could not start the job: {exc}")
+        return
+    future.add_done_callback(functools.partial(_job_finished, job.pk))
+
+
+def recover_jobs():
+    """
+    Fail the jobs a previous run of the server left running (they may be
+    what brought it down) and resubmit the ones it left queued.
+    """
+    from .models import UploadJob
+    from .writequeue import run_write
+
+    for job_id in UploadJob.objects.filter(status=UploadJob.RUNNING).values_list('pk', flat=True):
+        run_write(fail_job, job_id, "Interrupted by a server restart.")
+    for job in UploadJob.objects.filter(status=UploadJob.QUEUED).exclude(file=''):
+        submit_upload_job(job)
+
+
+def _recover_on_first_request(**kwargs):
+    request_started.disconnect(_recover_on_first_request, dispatch_uid=RECOVER_UID)
+    if getattr(settings, 'ANALYTICS_RECOVER_JOBS', True):
+        try:
+            recover_jobs()
+        except Exception:
+            logger.exception("Could not recover upload jobs")
+
+
+def connect_recovery():
+    """Recover jobs once this process starts serving requests (not in ready(), which must not query)."""
+    request_started.connect(_recover_on_first_request, dispatch_uid=RECOVER_UID)
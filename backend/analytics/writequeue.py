@@ -0,0 +1,151 @@
+"""
+In-process queue that serialises database writes onto one thread.
+
+SQLite allows a single writer at a time. Rather than have request threads
+race for the lock (and retry on "database is locked"), every write runs on a
+dedicated writer thread. Summaries queued close together are coalesced: they
+are inserted with one bulk_create and share a single retention pass, in one
+transaction.
+
+Only short writes belong on the queue: callers parse and validate their
+uploads first and hand over finished summaries, then store outliers and rows
+in bounded batches, so a large upload never holds the write lock while it is
+read. Small writes from request handlers (upload sessions, jobs) go through
+the queue too rather than racing it for the lock.
+
+Worker processes each get their own queue; SQLite's busy_timeout settles the
+rare contention between processes.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES = {
+    "enabled": True,
+    # Most summaries stored in one transaction
+    "max_batch": 50,
+    # Seconds to wait for more summaries after the first one arrives
+    "max_delay": 0.005,
+}
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_rules():
+    return {**DEFAULT_RULES, **getattr(settings, 'ANALYTICS_WRITE_QUEUE', {})}
+
+
+class WriteQueue:
+    def __init__(self, max_batch, max_delay):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.items = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name='analytics-writer', daemon=True)
+        self.thread.start()
+
+    def on_writer(self):
+        return threading.current_thread() is self.thread
+
+    def run(self, func, *args, **kwargs):
+        """Run ``func`` on the writer thread and return its result (or raise its error)."""
+        if self.on_writer():
+            return func(*args, **kwargs)
+        future = Future()
+        self.items.put((future, func, args, kwargs))
+        return future.result()
+
+    def store(self, summary):
+        """Store one summary (see pipeline.store_summaries), coalesced with others queued with it."""
+        if self.on_writer():
+            return _store_batch([summary])[0]
+        future = Future()
+        self.items.put((future, None, summary, {}))
+        return future.result()
+
+    def _collect(self, first):
+        """Gather further queued summaries behind ``first``; returns (batch, next item)."""
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                item = self.items.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                return batch, None
+            if item[1] is not None:
+                return batch, item
+            batch.append(item)
+        return batch, None
+
+    def _run(self):
+        pending = None
+        while True:
+            item = pending or self.items.get()
+            pending = None
+            close_old_connections()
+            future, func, args, kwargs = item
+            if func is not None:
+                _resolve(future, func, *args, **kwargs)
+                continue
+
+            batch, pending = self._collect(item)
+            try:
+                records = _store_batch([summary for _, _, summary, _ in batch])
+            except Exception as exc:
+                if len(batch) == 1:
+                    item[0].set_exception(exc)
+                    continue
+                # Store one by one so a single bad summary only fails its own upload
+                logger.warning("Coalesced write of %d summaries failed; retrying singly", len(batch))
+                for future, _, summary, _ in batch:
+                    _resolve(future, lambda summary=summary: _store_batch([summary])[0])
+                continue
+            for (future, _, _, _), record in zip(batch, records):
+                future.set_result(record)
+
+
+def _resolve(future, func, *args, **kwargs):
+    try:
+        future.set_result(func(*args, **kwargs))
+    except BaseException as exc:
+        future.set_exception(exc)
+
+
+def _store_batch(summaries):
+    from .pipeline import store_summaries
+
+    return store_summaries(summaries)
+
+
+def get_write_queue():
+    """The process's write queue, or None when writes run on the calling thread."""
+    global _queue
+    rules = get_rules()
+    if not rules["enabled"]:
+        return None
+    with _queue_lock:
+        if _queue is None:
+            _queue = WriteQueue(rules["max_batch"], rules["max_delay"])
+        return _queue
+
+
+def run_write(func, *args, **kwargs):
+    write_queue = get_write_queue()
+    if write_queue is None:
+        return func(*args, **kwargs)
+    return write_queue.run(func, *args, **kwargs)
+
+
+def queue_summary(summary):
+    """Store a computed summary through the write queue; returns the saved row."""
+    write_queue = get_write_queue()
+    if write_queue is None:
+        return _store_batch([summary])[0]
+    return write_queue.store(summary)
@@ -80,6 +80,21 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # WAL lets readers run alongside a writer; synchronous=NORMAL is
+            # durable in WAL mode and skips an fsync per commit; mmap_size
+            # (256 MiB) serves reads from the page cache.
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA mmap_size=268435456;'
+            ),
+            # Seconds to wait on a locked database (SQLite's busy_timeout)
+            'timeout': 20,
+            # Take the write lock at BEGIN, so a transaction never fails
+            # upgrading from read to write while another one commits
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
@@ -124,3 +139,75 @@ STATIC_URL = 'static/'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# Uploads are spooled to disk and memory-mapped for parsing, never kept in RAM
+FILE_UPLOAD_HANDLERS = ['analytics.uploadhandlers.DiskUploadHandler']
+FILE_UPLOAD_MAX_MEMORY_SIZE = 0
+
+# Analytics ingestion
+# Rows per chunk when streaming uploaded CSVs; bounds peak memory per upload
+# with the C engine.
+ANALYTICS_CSV_CHUNK_SIZE = 100_000
+# CSV parser: 'c' (pandas) or 'pyarrow'. The C engine holds one chunk at a
+# time. pyarrow parses faster, but its reader runs ahead of the aggregation,
+# so peak memory grows with the file.
+ANALYTICS_CSV_ENGINE = 'c'
+# Bytes parsed at a time by the pyarrow engine; each block is then split
+# into chunks of at most ANALYTICS_CSV_CHUNK_SIZE rows. This sets the unit
+# of pyarrow's readahead, not a bound on it.
+ANALYTICS_CSV_BLOCK_SIZE = 16 * 1024 * 1024
+# Bytes written per piece when spooling uploads to disk.
+ANALYTICS_UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Worker processes for background (mode=async) upload jobs.
+ANALYTICS_WORKER_PROCESSES = 2
+# On the first request after startup, fail jobs the last run left running and
+# resubmit the queued ones. Assumes a single web process owns the job table.
+ANALYTICS_RECOVER_JOBS = True
+# Maximum number of files (or zip members) accepted by /api/upload/batch/.
+ANALYTICS_BATCH_MAX_FILES = 100
+# Maximum total uncompressed size of a zip sent to /api/upload/batch/.
+ANALYTICS_BATCH_MAX_EXPANDED_SIZE = 1024 ** 3
+# Keep every uploaded row in EquipmentRecord for drill-down queries. Rows are
+# loaded after the summary is stored, in transactions of their own, so the
+# summary is visible (with records_loaded false) while they load. When off, the
+# records endpoint answers 409 for uploads whose rows were not kept.
+ANALYTICS_STORE_RECORDS = False
+# Rows per write transaction when loading EquipmentRecord; other writes
+# queue behind each batch, so smaller batches keep them waiting less.
+ANALYTICS_RECORD_BATCH_SIZE = 10_000
+# Overrides for upload validation rules (ranges, allowed_types, reject,
+# sample_size); see analytics.validation.DEFAULT_RULES. Ranges are open by
+# default, e.g. {'ranges': {'Flowrate': (0, None)}} refuses negative flowrates.
+ANALYTICS_VALIDATION = {}
+# KLL sketch size per parameter; rank error is about 1.3% at 200 and halves
+# roughly with every doubling.
+ANALYTICS_SKETCH_K = 200
+# Target relative standard error of distinct equipment counts (HyperLogLog);
+# 0.01 gives 2^14 registers.
+ANALYTICS_DISTINCT_ERROR = 0.01
+# Overrides for outlier flagging (enabled, methods, z_threshold, iqr_factor,
+# by_type); see analytics.outliers.DEFAULT_RULES.
+ANALYTICS_OUTLIERS = {}
+# Bins per stored histogram (fixed-width and quantile). Fixed-width counts are
+# exact once an upload's outlier scan has run; appended datasets and the
+# quantile bins keep sketch estimates.
+ANALYTICS_HISTOGRAM_BINS = 20
+# Retention tiers: the newest `detail` summaries are kept in full, older ones
+# are rolled into hourly then (after hourly_days) daily aggregates, and daily
+# aggregates older than daily_days are archived to MEDIA_ROOT/archive (or just
+# dropped if archive is False); see analytics.retention.DEFAULT_RULES.
+ANALYTICS_RETENTION = {}
+# Database writes run on one thread per process, with summaries that arrive
+# together stored in a single transaction (enabled, max_batch, max_delay in
+# seconds); see analytics.writequeue.DEFAULT_RULES.
+ANALYTICS_WRITE_QUEUE = {}
+# Shared by the web process and the upload workers, which invalidate
+# analytics.cache entries when their writes commit.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+    }
+}
+# Seconds a cached Summary/History response is kept for one cache version.
+ANALYTICS_CACHE_TIMEOUT = 300